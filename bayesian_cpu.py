@@ -22,9 +22,9 @@ from typing import Any
 
 import numpy as np
 
-from player import CpuAgent
+from player import CpuAgent, Status
 from card import Board, Hand
-from fast_eval import calculate_equity_fast
+from sim import calculate_equity
 from bayesian_strategy import BeliefTracker, PlayerProfile, hand_to_group
 
 
@@ -87,7 +87,7 @@ class BayesianCpu(CpuAgent):
             self._profiles[player_name] = PlayerProfile()
         profile = self._profiles[player_name]
 
-        board_cards = board.get_all_cards()
+        board_cards = board.cards
         is_preflop = len(board_cards) == 0
 
         # ── プロファイル更新 ────────────────────────────────────────────
@@ -141,14 +141,14 @@ class BayesianCpu(CpuAgent):
 
         active_opponents = [
             p for p in game_state['players']
-            if p['status'] in ('active', 'all-in') and p['name'] != self.name
+            if p['status'] <= Status.ALLIN and p['name'] != self.name
         ]
         num_opponents = len(active_opponents)
 
         # ── エクイティ計算（高速モンテカルロ）──
         equity = 0.5
         if self.hand is not None and num_opponents > 0:
-            equity = calculate_equity_fast(
+            equity = calculate_equity(
                 self.hand, board, num_opponents,
                 num_simulations=self._num_simulations,
                 rng=self._rng,
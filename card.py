@@ -1,4 +1,5 @@
 # テキサスホールデムでの役を判定するためのクラスを作成する
+import random
 
 SUITS_MAP = {'s': 'スペード', 'h': 'ハート', 'd': 'ダイヤ', 'c': 'クラブ'}
 RANKS_MAP = {
@@ -6,9 +7,15 @@ RANKS_MAP = {
     9: '9', 8: '8', 7: '7', 6: '6', 5: '5', 4: '4', 3: '3', 2: '2'
 }
 RANKS_STR_TO_INT = {v: k for k, v in RANKS_MAP.items()}
+# スート → 2bit インデックス（fast_eval の card_int と同じ並び）
+SUIT_TO_INT = {'s': 0, 'h': 1, 'd': 2, 'c': 3}
+INT_TO_SUIT = ('s', 'h', 'd', 'c')
 
 class Card:
-  """1枚のトランプカードを表すクラス"""
+  """1枚のトランプカードを表すクラス\n
+  内部では `(rank_int << 2) | suit_idx` の1つの整数だけを保持する"""
+  __slots__ = ('_code',)
+
   def __init__(self, suit: str, rank_int: int):
     """
     suit: スート ('s', 'h', 'd', 'c')
@@ -19,23 +26,37 @@ class Card:
     if rank_int not in RANKS_MAP:
       raise ValueError(f"無効なランクです: {rank_int}")
     
-    self._suit = suit
-    self._rank_int = rank_int
+    self._code = (rank_int << 2) | SUIT_TO_INT[suit]
 
   @property
   def suit(self) -> str:
     """スペード(s)、ハート(h)、ダイヤ(d)、クラブ(c)のいずれかを返す"""
-    return self._suit
+    return INT_TO_SUIT[self._code & 3]
 
   @property
   def rank_str(self) -> str:
     """A,2,3,4,5,6,7,8,9,T,J,Q,Kのいずれかを返す"""
-    return RANKS_MAP[self._rank_int]
+    return RANKS_MAP[self._code >> 2]
 
   @property
   def rank_int(self) -> int:
     """Aは14、Kは13、Qは12、Jは11、Tは10、2-9はそのままの数値を返す"""
-    return self._rank_int
+    return self._code >> 2
+
+  @property
+  def code(self) -> int:
+    """パック済みの整数 `(rank_int << 2) | suit_idx` を返す"""
+    return self._code
+
+  @property
+  def int_id(self) -> int:
+    """fast_eval / sim の card_int（`(rank_int - 2) * 4 + suit_idx`、0〜51）を返す"""
+    return self._code - 8
+
+  @property
+  def mask_bit(self) -> int:
+    """52bit マスク上のこのカードのビット（位置は `suit_idx * 13 + (rank_int - 2)`）"""
+    return 1 << ((self._code & 3) * 13 + (self._code >> 2) - 2)
 
   def colored_str(self) -> str:
     """スートに応じて色を付けた文字列を返す"""
@@ -47,34 +68,35 @@ class Card:
         'c': Fore.GREEN
     }
     symbol_map = {'s': '♠', 'h': '♥', 'd': '♦', 'c': '♣'}
-    return f"{color_map[self._suit]}{symbol_map[self._suit]}{self.rank_str}{Style.RESET_ALL}"
+    suit = self.suit
+    return f"{color_map[suit]}{symbol_map[suit]}{self.rank_str}{Style.RESET_ALL}"
 
   def __str__(self) -> str:
-    return self.suit + self.rank_str
+    return STR_FOR_CODE[self._code]
 
   def __repr__(self) -> str:
     """Cardクラスのインスタンスを文字列で表現するためのメソッド\n
     例: `repr(Card('s', 2))` は `Card('s', 2)` になる"""
-    return f"Card('{self.suit}', {self.rank_int})"
+    return REPR_FOR_CODE[self._code]
   
   def __lt__(self, other) -> bool:
     """Cardクラスのインスタンス同士を比較するためのメソッド\n
     スートに関係なく、ランクの大小を比較する\n
     例: `Card('s', 14) < Card('s', 2)` は `False` になる"""
-    if not isinstance(other, Card):
+    if type(other) is not Card:
         return NotImplemented
-    return self.rank_int < other.rank_int
+    return self._code >> 2 < other._code >> 2
 
   def __eq__(self, other) -> bool:
     """Cardクラスのインスタンス同士が等しいかどうかを比較するためのメソッド\n
     スートとランクの両方が同じなら等しいとみなす"""
-    if not isinstance(other, Card):
+    if type(other) is not Card:
         return NotImplemented
-    return self.rank_int == other.rank_int and self.suit == other.suit
+    return self._code == other._code
   
   def __hash__(self) -> int:
-    """Cardオブジェクトをハッシュ可能にするためのメソッド"""
-    return hash((self.suit, self.rank_int))
+    """Cardオブジェクトをハッシュ可能にするためのメソッド（パック済み整数をそのまま使う）"""
+    return self._code
 
 def create_deck() -> list[Card]:
     """52枚のトランプカードで構成されるデッキを生成する\nシャッフルはされていない"""
@@ -84,19 +106,101 @@ def create_deck() -> list[Card]:
             deck.append(Card(suit, rank_int))
     return deck
 
+# 不変な Card を共有する正規デッキ（毎ハンドの Card 生成を避けるため、コピーして使う）
+MASTER_DECK: tuple[Card, ...] = tuple(create_deck())
+
+# パック済み整数 → 表示文字列（__str__ / __repr__ を毎回組み立てないための事前計算）
+STR_FOR_CODE: dict[int, str] = {c.code: c.suit + c.rank_str for c in MASTER_DECK}
+REPR_FOR_CODE: dict[int, str] = {c.code: f"Card('{c.suit}', {c.rank_int})" for c in MASTER_DECK}
+# パック済み整数 → MASTER_DECK の共有 Card（未使用の code は None）。code 列から Card を引き直すときに使う
+CARD_BY_CODE: tuple[Card | None, ...] = tuple(
+  next((c for c in MASTER_DECK if c.code == code), None) for code in range(max(c.code for c in MASTER_DECK) + 1)
+)
+
+class Deck:
+  """部分 Fisher-Yates で必要な枚数だけを引くデッキ\n
+  52枚全体をシャッフルせず、draw() のたびに未使用部分から1枚を選んで末尾と入れ替える\n
+  pop() はせず、_remaining を添字として末尾側に引いたカードを積んでいく\n
+  （array('B') の code 列も試したが、CPython では list の要素入れ替えの方が数倍速い）"""
+  __slots__ = ('_cards', '_remaining', '_shuffled', '_randrange')
+
+  def __init__(self, cards: tuple[Card, ...] | list[Card] = MASTER_DECK, shuffled: bool = False,
+               rng: random.Random | None = None):
+    """cards: 元になるカード列（コピーして使う）\n
+    shuffled: True なら cards はシャッフル済みとみなし、末尾から順に引く\n
+    rng: 使用する乱数生成器（省略時はモジュール共有の random）"""
+    self._cards = list(cards)
+    self._remaining = len(self._cards)
+    self._shuffled = shuffled
+    self._randrange = (rng or random).randrange
+
+  def draw(self) -> Card:
+    """未使用のカードから1枚引く（O(1)）"""
+    if self._remaining == 0:
+      raise IndexError("デッキにカードが残っていません")
+    self._remaining -= 1
+    last = self._remaining
+    cards = self._cards
+    if not self._shuffled:
+      i = self._randrange(last + 1)
+      cards[i], cards[last] = cards[last], cards[i]
+    return cards[last]
+
+  def draw_n(self, n: int) -> list[Card]:
+    """未使用のカードから n 枚を引く（draw() を n 回呼ぶのと同じ分布）"""
+    last = self._remaining
+    if n > last:
+      raise IndexError("デッキにカードが残っていません")
+    cards = self._cards
+    out = []
+    if self._shuffled:
+      for _ in range(n):
+        last -= 1
+        out.append(cards[last])
+    else:
+      randrange = self._randrange
+      for _ in range(n):
+        i = randrange(last)
+        last -= 1
+        c = cards[i]
+        cards[i] = cards[last]
+        cards[last] = c
+        out.append(c)
+    self._remaining = last
+    return out
+
+  def reset(self):
+    """全カードを未使用に戻す（並び替えはしない）\n
+    _cards は常に元のカードの並べ替えなので、部分 Fisher-Yates で引く限りそのまま再利用できる\n
+    shuffled=True のデッキでは同じ順番が再び配られる点に注意"""
+    self._remaining = len(self._cards)
+
+  def __len__(self) -> int:
+    """残りのカード枚数を返す"""
+    return self._remaining
+
 # ハンドクラスを作成する
 class Hand:
   """2枚のハンドカードを表すクラス"""
+  __slots__ = ('cards', 'sorted_cards', 'mask', '_eval_board_mask', '_eval_cache')
+
   def __init__(self, cards: tuple[Card, Card]):
     """cards: 2枚のCardクラスのインスタンスをタプルで渡す"""
     self.cards = cards
+    # ランクの高い順に並べた2枚（同ランクは元の順番）。表示のたびに sorted() しないよう作成時に決めておく
+    a, b = cards
+    self.sorted_cards: tuple[Card, Card] = (a, b) if a._code >> 2 >= b._code >> 2 else (b, a)
+    # 52bit のカードマスク（Card.mask_bit の OR）
+    self.mask: int = cards[0].mask_bit | cards[1].mask_bit
+    # evaluate_hand の結果キャッシュ（直近に評価したボードの mask とその EvaluatedHand）
+    self._eval_board_mask: int = -1
+    self._eval_cache = None
 
   def __str__(self) -> str:
     """Handクラスのインスタンスを文字列に変換するためのメソッド\n
     例: `str(Hand((Card('s', 14), Card('s', 2))))` は `sA s2` になる"""
-    # カードをランクの降順でソートしてから文字列に変換する
-    sorted_cards = sorted(self.cards, reverse=True)
-    return ' '.join(str(card) for card in sorted_cards)
+    hi, lo = self.sorted_cards
+    return f'{hi} {lo}'
 
   def __repr__(self) -> str:
     """Handクラスのインスタンスを文字列で表現するためのメソッド\n
@@ -112,10 +216,78 @@ class Board:
   flopsは3枚、turnは1枚、riverは1枚のカードを持つ"""
   # flops, turn, riverはすべてCardクラスのインスタンスを持つ
   # init状態ではすべてNoneで初期化され、あとからflops, turn, riverをセットする
+  # mask はセットされたカードの 52bit マスク、cards はセットされたカードのタプル（flops, turn, river の順）で、
+  # どちらも flops / turn / river の代入時に更新される
+  # _texture_cache は gto_strategy.classify_board_texture が (mask, テクスチャ) を覚えておく場所
+  __slots__ = ('_flops', '_turn', '_river', 'mask', 'cards', '_texture_cache')
+
   def __init__(self):
-    self.flops: tuple[Card, Card, Card] | None = None
-    self.turn: Card | None = None
-    self.river: Card | None = None
+    self._flops: tuple[Card, Card, Card] | None = None
+    self._turn: Card | None = None
+    self._river: Card | None = None
+    self.mask: int = 0
+    self.cards: tuple[Card, ...] = ()
+    self._texture_cache: tuple[int, str] | None = None
+
+  @classmethod
+  def from_cards(cls, cards) -> 'Board':
+    """0・3・4・5枚のカード列（flops, turn, river の順）からボードを一度に作る\n
+    set_flops / set_turn / set_river を順に呼ぶのと同じ結果で、マスクの作り直しは1回で済む"""
+    cards = tuple(cards)
+    if len(cards) not in (0, 3, 4, 5):
+      raise ValueError(f"ボードのカード枚数が不正です: {len(cards)}")
+    board = cls()
+    if cards:
+      board._flops = cards[:3]
+      board._turn = cards[3] if len(cards) > 3 else None
+      board._river = cards[4] if len(cards) > 4 else None
+      board._update_mask()
+    return board
+
+  def _update_mask(self):
+    """flops, turn, river から 52bit マスクとカードのタプルを作り直す（最大5枚）"""
+    cards = tuple(self._flops) if self._flops else ()
+    if self._turn:
+      cards += (self._turn,)
+    if self._river:
+      cards += (self._river,)
+    mask = 0
+    for card in cards:
+      mask |= card.mask_bit
+    self.cards = cards
+    self.mask = mask
+
+  @property
+  def flops(self) -> tuple[Card, Card, Card] | None:
+    return self._flops
+
+  @flops.setter
+  def flops(self, cards: tuple[Card, Card, Card] | None):
+    self._flops = cards
+    self._update_mask()
+
+  @property
+  def turn(self) -> Card | None:
+    return self._turn
+
+  @turn.setter
+  def turn(self, card: Card | None):
+    self._turn = card
+    self._update_mask()
+
+  @property
+  def river(self) -> Card | None:
+    return self._river
+
+  @river.setter
+  def river(self, card: Card | None):
+    self._river = card
+    self._update_mask()
+
+  @property
+  def card_count(self) -> int:
+    """セット済みのボードカード枚数（マスクの popcount）"""
+    return self.mask.bit_count()
 
   def set_flops(self, cards: tuple[Card, Card, Card]):
     """flopsをセットするためのメソッド"""
@@ -148,15 +320,12 @@ class Board:
     return f'Board(flops={flops_repr}, turn={turn_repr}, river={river_repr})'
   
   def get_all_cards(self) -> list[Card]:
-    """ボードカードをすべてlistで返す（順序を維持する）"""
-    cards: list[Card] = []
-    if self.flops:
-      cards.extend(self.flops)
-    if self.turn:
-      cards.append(self.turn)
-    if self.river:
-      cards.append(self.river)
-    return cards
+    """ボードカードをすべてlistで返す（順序を維持する）。読むだけなら cards のタプルをそのまま使える"""
+    return list(self.cards)
+
+  def iter_cards(self):
+    """ボードカードを順に返すイテレータ（list を作らずに走査したい呼び出し元向け）"""
+    return iter(self.cards)
   
   def is_complete(self) -> bool:
     """ボードカードがすべてセットされているかどうかを返す"""
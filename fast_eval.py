@@ -7,22 +7,24 @@ fast_eval.py
   rank: 2-14 → 0-12  (card_int // 4 + 2 でデコード)
   suit: 0='s', 1='h', 2='d', 3='c'  (card_int % 4 でデコード)
 
-evaluate_hand() の Counter ベースの実装を整数配列索引で置き換え、
-calculate_equity() を numpy 一括サンプリングに置き換えることで
-高速化を実現する。
+evaluate_hand() の Counter ベースの実装を整数配列索引で置き換えて高速化する。
+モンテカルロのエクイティ計算は sim.calculate_equity（一括評価のカーネル）を使う。
 
 最適化のポイント:
 - sorted() 呼び出しを最小化：rc を 14→2 の降順でスキャン
 - Counter オブジェクト不使用（rc = [0]*15 リスト索引）
 - _hand_score は定数倍算のみ（リスト生成なし）
-- numpy 一括サンプリング（argsort による置換サンプリング）
+- 7枚を1回のテーブル引きで評価する eval7（sim のカーネルも同じテーブルを使う）
 """
 from __future__ import annotations
 
-import numpy as np
+import os
+import zipfile
+from collections import Counter
+from itertools import combinations_with_replacement
+from typing import Callable
 
-# スートの文字 → 整数マッピング
-_SUIT_TO_INT: dict[str, int] = {'s': 0, 'h': 1, 'd': 2, 'c': 3}
+import numpy as np
 
 # スコア計算定数（15進数エンコード）
 _B6 = 15 ** 6  # hand_rank
@@ -34,32 +36,30 @@ _B1 = 15       # k2
 # k3 は × 1
 
 
-def card_to_int(card) -> int:
-    """Card オブジェクト → card_int"""
-    return (card.rank_int - 2) * 4 + _SUIT_TO_INT[card.suit]
-
-
 def _hs(hr: int, p: int = 0, s: int = 0,
          k0: int = 0, k1: int = 0, k2: int = 0, k3: int = 0) -> int:
     """ハンドスコア計算（引数展開で list 生成を回避）"""
     return hr * _B6 + p * _B5 + s * _B4 + k0 * _B3 + k1 * _B2 + k2 * _B1 + k3
 
 
-def _straight_high_desc(unique_r: list[int]) -> int:
+def _build_straight_high() -> list[int]:
     """
-    降順ユニークランクリストからストレートの最高位ランクを返す（なければ0）。
-    unique_r は重複なし・降順であることが前提。
+    13bit ランクマスク（bit r-2 = ランク r）→ ストレートの最高位ランク（なければ0）の表。
+    5連続ビットは m & m>>1 & m>>2 & m>>3 & m>>4 の最上位ビットで拾う（SWAR）。
     """
-    n = len(unique_r)
-    for i in range(n - 4):
-        if unique_r[i] - unique_r[i + 4] == 4:
-            return unique_r[i]
-    # A-2-3-4-5 ホイール
-    if n >= 5 and unique_r[0] == 14 and unique_r[-1] <= 5:
-        s = set(unique_r)
-        if 2 in s and 3 in s and 4 in s and 5 in s:
-            return 5
-    return 0
+    table = [0] * 8192
+    wheel = 0b1000000001111  # A-2-3-4-5
+    for m in range(8192):
+        run = m & (m >> 1) & (m >> 2) & (m >> 3) & (m >> 4)
+        if run:
+            table[m] = run.bit_length() + 5
+        elif m & wheel == wheel:
+            table[m] = 5
+    return table
+
+
+# ランクマスクを1回引くだけでストレート判定が済む
+STRAIGHT_HIGH: list[int] = _build_straight_high()
 
 
 def evaluate_7_score(cards7) -> int:
@@ -99,18 +99,10 @@ def evaluate_7_score(cards7) -> int:
         flush_mask = 0
         for c in cards7:
             if c % 4 == flush_suit:
-                flush_mask |= (1 << (c // 4 + 2))
+                flush_mask |= (1 << (c // 4))
 
-        # ストレートフラッシュ判定（ビットマスク）
-        sf = 0
-        for high in range(14, 4, -1):
-            if (flush_mask >> (high - 4)) & 0b11111 == 0b11111:
-                sf = high
-                break
-        if sf == 0:
-            wheel_mask = (1 << 14) | (1 << 5) | (1 << 4) | (1 << 3) | (1 << 2)
-            if (flush_mask & wheel_mask) == wheel_mask:
-                sf = 5
+        # ストレートフラッシュ判定（ランクマスクの表引き）
+        sf = STRAIGHT_HIGH[flush_mask]
         if sf:
             hr = 9 if sf == 14 else 8
             return hr * _B6 + sf * _B5
@@ -119,7 +111,7 @@ def evaluate_7_score(cards7) -> int:
         fr0 = fr1 = fr2 = fr3 = fr4 = 0
         fi = 0
         for r in range(14, 1, -1):
-            if flush_mask & (1 << r):
+            if flush_mask & (1 << (r - 2)):
                 if fi == 0: fr0 = r
                 elif fi == 1: fr1 = r
                 elif fi == 2: fr2 = r
@@ -161,19 +153,14 @@ def evaluate_7_score(cards7) -> int:
         if best_pair > 0:
             return _hs(6, t1, best_pair)
 
-    # ── ストレート（ビットマスク判定）──
+    # ── ストレート（ランクマスクの表引き）──
     rank_mask = 0
     for r in range(2, 15):
         if rc[r] > 0:
-            rank_mask |= (1 << r)
-
-    for high in range(14, 4, -1):
-        if (rank_mask >> (high - 4)) & 0b11111 == 0b11111:
-            return _hs(4, high)
-    # ホイール A-2-3-4-5
-    wheel_mask = (1 << 14) | (1 << 5) | (1 << 4) | (1 << 3) | (1 << 2)
-    if (rank_mask & wheel_mask) == wheel_mask:
-        return _hs(4, 5)
+            rank_mask |= (1 << (r - 2))
+    high = STRAIGHT_HIGH[rank_mask]
+    if high:
+        return _hs(4, high)
 
     # ── スリーカード（フルハウスなし）──
     if max_cnt >= 3:
@@ -244,93 +231,218 @@ def evaluate_7_score(cards7) -> int:
     return _hs(0, u0, 0, u1, u2, u3, u4)
 
 
-def calculate_equity_fast(my_hand, board, num_opponents: int,
-                          num_simulations: int = 400,
-                          rng: np.random.Generator | None = None) -> float:
+# ══════════════════════════════════════════════════════════════════════
+# テーブル評価（5枚テーブル → 7枚直接テーブル）
+# ══════════════════════════════════════════════════════════════════════
+#
+# フラッシュはそのスートの 13bit ランクマスク、それ以外はランクごとの素数の積
+# （ペア系ハンドの完全ハッシュキー）で引く。5枚のテーブルを作ってから 6・7枚へ広げる。
+# テーブルの値は evaluate_7_score と同じ15進スコアなので、両者は混在して比較できる。
+
+_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def _score5(ranks: tuple[int, ...], flush: bool) -> int:
+    """5枚のランク（2-14）とフラッシュ有無から15進スコアを返す（テーブル構築用）"""
+    cnt = Counter(ranks)
+    # 枚数 → ランクの降順で並べる（例: フルハウスは [trips, pair]）
+    groups = sorted(cnt.items(), key=lambda x: (x[1], x[0]), reverse=True)
+    shape = tuple(n for _, n in groups)
+    gr = [r for r, _ in groups]
+    if shape == (1, 1, 1, 1, 1):
+        desc = sorted(ranks, reverse=True)
+        high = 0
+        if desc[0] - desc[4] == 4:
+            high = desc[0]
+        elif desc == [14, 5, 4, 3, 2]:
+            high = 5
+        if flush:
+            if high:
+                return (9 if high == 14 else 8) * _B6 + high * _B5
+            return 5 * _B6 + desc[0] * _B5 + desc[1] * _B3 + desc[2] * _B2 + desc[3] * _B1 + desc[4]
+        if high:
+            return _hs(4, high)
+        return _hs(0, desc[0], 0, desc[1], desc[2], desc[3], desc[4])
+    if shape == (4, 1):
+        return _hs(7, gr[0], 0, gr[1])
+    if shape == (3, 2):
+        return _hs(6, gr[0], gr[1])
+    if shape == (3, 1, 1):
+        return _hs(3, gr[0], 0, gr[1], gr[2])
+    if shape == (2, 2, 1):
+        return _hs(2, gr[0], gr[1], gr[2])
+    return _hs(1, gr[0], 0, gr[1], gr[2], gr[3])
+
+
+def _build_tables() -> tuple[list[int], list[int], dict[int, int]]:
+    """5枚のフラッシュ / ユニークランク（13bit ランクマスク索引）とペア系（素数積キー）のテーブルを構築する"""
+    flush = [0] * 8192
+    unique5 = [0] * 8192
+    unsuited: dict[int, int] = {}
+    for ranks in combinations_with_replacement(range(2, 15), 5):
+        if max(Counter(ranks).values()) > 4:
+            continue
+        if len(set(ranks)) == 5:
+            m = 0
+            for r in ranks:
+                m |= 1 << (r - 2)
+            flush[m] = _score5(ranks, True)
+            unique5[m] = _score5(ranks, False)
+        else:
+            key = 1
+            for r in ranks:
+                key *= _PRIMES[r - 2]
+            unsuited[key] = _score5(ranks, False)
+    return flush, unique5, unsuited
+
+
+def _build_tables7(flush5: list[int], unique5: list[int],
+                   unsuited: dict[int, int]) -> tuple[list[int], dict[int, int]]:
     """
-    numpy 一括サンプリング + 整数評価による高速エクイティ計算。
+    7枚を直接引くテーブルを5枚テーブル（_build_tables の結果）から構築する。
 
-    my_hand: Hand オブジェクト
-    board:   Board オブジェクト
-    num_opponents: アクティブな相手の数
-    num_simulations: モンテカルロ試行回数
-    rng: numpy.random.Generator（省略時は都度生成）
+    FLUSH7_LOOKUP:   13bit ランクマスク（5〜7ビット）→ そのスート内のベスト5枚のスコア
+    NOFLUSH7_LOOKUP: 5〜7枚のランクの素数積 → ベスト5枚のスコア
+    n 枚の値は「1枚除いた n-1 枚の値の最大」なので、5→6→7 枚と順に広げる。
+    素因数分解は一意なので、枚数の異なる素数積が同じキーになることはない（1つの dict に同居できる）。
+    """
+    flush7 = list(flush5)
+    for m in range(8192):
+        if m.bit_count() > 5:
+            best = 0
+            x = m
+            while x:
+                b = x & -x
+                v = flush7[m ^ b]
+                if v > best:
+                    best = v
+                x ^= b
+            flush7[m] = best
+
+    prev = dict(unsuited)
+    for m in range(8192):
+        if m.bit_count() == 5:
+            key = 1
+            for r in range(13):
+                if m >> r & 1:
+                    key *= _PRIMES[r]
+            prev[key] = unique5[m]
+    noflush = dict(prev)
+    for n in (6, 7):
+        cur: dict[int, int] = {}
+        for ranks in combinations_with_replacement(range(13), n):
+            key = 1
+            for r in ranks:
+                key *= _PRIMES[r]
+            best = 0
+            for r in set(ranks):
+                v = prev.get(key // _PRIMES[r], 0)
+                if v > best:
+                    best = v
+            if best:
+                cur[key] = best
+        noflush.update(cur)
+        prev = cur
+    return flush7, noflush
+
+
+# ── 構築済みテーブルのディスクキャッシュ ──────────────────────────────
+# 構築には import ごとに 100ms 以上かかるので、初回に __pycache__ へ npz で書き出し、
+# 以降は読み込むだけにする。構築手順を変えたら _TABLES_VERSION を上げること
+# （ファイル名に入るので古いキャッシュは読まれなくなる）。
+_TABLES_VERSION = 2
+_TABLES_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+
+def _cached_tables(name: str, keys: tuple[str, ...],
+                   build: Callable[[], dict[str, np.ndarray]],
+                   valid: Callable[[dict[str, np.ndarray]], bool]) -> dict[str, np.ndarray]:
     """
-    if num_opponents <= 0:
-        return 1.0
-
-    # ── カードを整数に変換 ──
-    my_ints: list[int] = [card_to_int(c) for c in my_hand.cards]
-    board_list = board.get_all_cards()
-    board_ints: list[int] = [card_to_int(c) for c in board_list]
-
-    known_set = set(my_ints + board_ints)
-    remaining = np.array([i for i in range(52) if i not in known_set], dtype=np.int32)
-    n_rem = len(remaining)
-
-    n_board_needed = 5 - len(board_ints)
-    n_opp_cards = num_opponents * 2
-    n_needed = n_board_needed + n_opp_cards
-
-    if rng is None:
-        rng = np.random.default_rng()
-
-    # ── 全シミュレーション分を一括サンプリング ──
-    # argpartition で O(n_rem) per row（argsort の O(n_rem log n_rem) より高速）
-    rand_vals = rng.random((num_simulations, n_rem))
-    perm_idx = np.argpartition(rand_vals, n_needed, axis=1)[:, :n_needed]
-    all_chosen = remaining[perm_idx]  # (num_simulations, n_needed) int32
-
-    # ── 評価ループ（事前割り当てリストで list concat を回避）──
-    all_chosen_list = all_chosen.tolist()  # Python list of lists（一回のみ変換）
-
-    board_len = len(board_ints)
-    # 7枚のワークスペースを1回だけ確保
-    my_7 = [0, 0, 0, 0, 0, 0, 0]
-    opp_7 = [0, 0, 0, 0, 0, 0, 0]
-    # my_hand の2枚は不変
-    my_7[0] = my_ints[0]
-    my_7[1] = my_ints[1]
-
-    wins = 0.0
-    for i in range(num_simulations):
-        chosen = all_chosen_list[i]
-
-        # ボード5枚をmy_7[2..6] に直接書き込み
-        ptr_b = 0
-        for j in range(board_len):
-            my_7[2 + ptr_b] = board_ints[j]
-            ptr_b += 1
-        for j in range(n_board_needed):
-            my_7[2 + ptr_b] = chosen[j]
-            ptr_b += 1
-
-        my_score = evaluate_7_score(my_7)
-
-        # 相手ハンドも同じボードを共有
-        opp_7[2] = my_7[2]
-        opp_7[3] = my_7[3]
-        opp_7[4] = my_7[4]
-        opp_7[5] = my_7[5]
-        opp_7[6] = my_7[6]
-
-        max_opp = 0
-        tie_count = 0
-        ptr = n_board_needed
-        for _ in range(num_opponents):
-            opp_7[0] = chosen[ptr]
-            opp_7[1] = chosen[ptr + 1]
-            opp_score = evaluate_7_score(opp_7)
-            if opp_score > max_opp:
-                max_opp = opp_score
-                tie_count = 1
-            elif opp_score == max_opp:
-                tie_count += 1
-            ptr += 2
-
-        if my_score > max_opp:
-            wins += 1.0
-        elif my_score == max_opp:
-            wins += 1.0 / (tie_count + 1)
-
-    return wins / num_simulations
+    build() が返す配列の辞書を __pycache__/{name}.v{_TABLES_VERSION}.npz にキャッシュする。
+
+    ファイルが無い・壊れている（zip の CRC 不一致を含む）・keys が揃っていない・valid() が偽
+    （形や長さが合わない）場合は build() で作り直して書き出す。
+    書き込みに失敗しても（読み取り専用のインストール先など）構築結果をそのまま返す。
+    """
+    path = os.path.join(_TABLES_CACHE_DIR, f"{name}.v{_TABLES_VERSION}.npz")
+    try:
+        with np.load(path, allow_pickle=False) as f:
+            tables = {k: f[k] for k in keys}
+        if valid(tables):
+            return tables
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        pass
+    tables = build()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(_TABLES_CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            np.savez(f, **tables)
+        os.replace(tmp, path)   # 並行 import でも読み手が書きかけのファイルを見ないように
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return tables
+
+
+def _build_lookup_arrays() -> dict[str, np.ndarray]:
+    """
+    7枚テーブルを配列に詰める（dict はキー列と値列に分ける）。
+    5枚テーブルは 7枚テーブルの構築にしか使わないので、ここで捨てる。
+    """
+    flush7, noflush7 = _build_tables7(*_build_tables())
+    return {
+        "flush7": np.array(flush7, dtype=np.int64),
+        "noflush7_keys": np.array(list(noflush7), dtype=np.int64),
+        "noflush7_vals": np.array(list(noflush7.values()), dtype=np.int64),
+    }
+
+
+_T = _cached_tables(
+    "fast_eval_tables",
+    ("flush7", "noflush7_keys", "noflush7_vals"),
+    _build_lookup_arrays,
+    lambda t: (t["flush7"].shape == (8192,)
+               and t["noflush7_keys"].ndim == 1
+               and t["noflush7_keys"].shape == t["noflush7_vals"].shape),
+)
+FLUSH7_LOOKUP: list[int] = _T["flush7"].tolist()
+NOFLUSH7_LOOKUP: dict[int, int] = dict(zip(_T["noflush7_keys"].tolist(), _T["noflush7_vals"].tolist()))
+del _T
+
+# card_int → ランクの素数 / スート枚数カウンタ（3bit × 4スート）への加算値 / ランクのビット
+CARD_PRIME: tuple[int, ...] = tuple(_PRIMES[c >> 2] for c in range(52))
+CARD_SUIT_W: tuple[int, ...] = tuple(1 << (3 * (c & 3)) for c in range(52))
+CARD_RANK_BIT: tuple[int, ...] = tuple(1 << (c >> 2) for c in range(52))
+# スート枚数カウンタ（12bit）→ 5枚以上あるスート（なければ -1）
+FLUSH_SUIT: tuple[int, ...] = tuple(
+    next((s for s in range(4) if (k >> (3 * s)) & 7 >= 5), -1) for k in range(4096)
+)
+
+
+def eval7(cards7) -> int:
+    """
+    7枚のカード整数のスコアを、5枚組を列挙せずに1回のテーブル引きで返す。
+
+    フラッシュでなければランクの素数積で NOFLUSH7_LOOKUP を、
+    フラッシュならそのスートのランクマスクで FLUSH7_LOOKUP を引く。
+    テーブルは5〜6枚も含むので、フロップ・ターン時点の5〜6枚もそのまま渡せる。
+
+    cards7: 5〜7 個の card_int（evaluate_7_score と同じ表現）
+    戻り値: evaluate_7_score と同一スケールのスコア
+    """
+    key = 1
+    sk = 0
+    for c in cards7:
+        key *= CARD_PRIME[c]
+        sk += CARD_SUIT_W[c]
+    s = FLUSH_SUIT[sk]
+    if s < 0:
+        return NOFLUSH7_LOOKUP[key]
+    m = 0
+    for c in cards7:
+        if c & 3 == s:
+            m |= CARD_RANK_BIT[c]
+    return FLUSH7_LOOKUP[m]
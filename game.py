@@ -1,17 +1,23 @@
 import random
 from typing import List
-from card import Card, Hand, Board, create_deck
-from player import Player
+from card import Hand, Board, Deck
+from player import Player, Status, FOLD, CHECK, CALL, RAISE, ACTIONS_FOR_MASK
 from hand_strength import evaluate_hand
+from fast_eval import eval7
 from colorama import Fore, Style, init
 
 # Windowsでの色表示を有効化
 init(autoreset=True)
 
 class Game:
-    def __init__(self, players: List[Player], start_chips: int = 1000, sb: int = 10, bb: int = 20, silent: bool = False):
+    def __init__(self, players: List[Player], start_chips: int = 1000, sb: int = 10, bb: int = 20, silent: bool = False,
+                 seed: int | None = None):
         self.players = players
-        self.deck: List[Card] = []
+        # Game ごとに独立した乱数生成器（並列シミュレーションで共有状態を持たない・seed で再現可能）
+        self._rng = random.Random(seed)
+        # ラウンドごとに reset() して使い回すデッキ（_make_deck 参照）
+        self._round_deck = Deck(rng=self._rng)
+        self.deck = self._round_deck
         self.board = Board()
         self.pot: int = 0
         self.dealer_pos: int = 0
@@ -22,21 +28,20 @@ class Game:
         
         for p in self.players:
             p.chips = start_chips
+        self._refresh_status_counts()
 
     def _log(self, message: str = ""):
         if not self.silent:
             print(message)
 
     def get_active_players(self) -> List[Player]:
-        return [p for p in self.players if p.status in ('active', 'all-in')]
+        return [p for p in self.players if p.status <= Status.ALLIN]
     
     def get_contesting_players(self) -> List[Player]:
-        return [p for p in self.players if p.status != 'folded' and p.status != 'busted']
+        return [p for p in self.players if p.status <= Status.ALLIN]
 
     def start_round(self):
         self._log(f"\n{Fore.GREEN}=== 新しいラウンドを開始します ==={Style.RESET_ALL}")
-        self.deck = create_deck()
-        random.shuffle(self.deck)
         self.board = Board()
         self.pot = 0
         self.current_bet = 0
@@ -50,10 +55,10 @@ class Game:
             return False
 
         sb_pos = (self.dealer_pos + 1) % len(self.players)
-        while self.players[sb_pos].status == 'busted':
+        while self.players[sb_pos].status == Status.BUSTED:
             sb_pos = (sb_pos + 1) % len(self.players)
         bb_pos = (sb_pos + 1) % len(self.players)
-        while self.players[bb_pos].status == 'busted':
+        while self.players[bb_pos].status == Status.BUSTED:
             bb_pos = (bb_pos + 1) % len(self.players)
             
         self._log(f"ディーラー: {Fore.CYAN}{self.players[self.dealer_pos].name}{Style.RESET_ALL}")
@@ -67,22 +72,23 @@ class Game:
         self._log(f"{Fore.YELLOW}{self.players[bb_pos].name}{Style.RESET_ALL} がBB {bb_amount} を支払いました。")
 
         self.deck = self._make_deck(contesting)
-        for p in contesting:
-            card1 = self.deck.pop()
-            card2 = self.deck.pop()
-            p.hand = Hand((card1, card2))
+        # 手札はまとめて 2N 枚引き、2枚ずつ配る
+        hole = self.deck.draw_n(2 * len(contesting))
+        for i, p in enumerate(contesting):
+            p.hand = Hand((hole[2 * i], hole[2 * i + 1]))
         return True
 
-    def _make_deck(self, contesting: list) -> list:
-        """デッキを生成してシャッフルする。サブクラスでオーバーライドすることで
-        特定ボードテクスチャへのバイアスが可能（gto_rare_training 用）。"""
-        deck = create_deck()
-        random.shuffle(deck)
-        return deck
+    def _make_deck(self, contesting: list) -> Deck:
+        """ラウンド用のデッキを返す（カードは draw() 時に部分 Fisher-Yates で選ばれる）。
+        __init__ で作ったデッキを reset() して使い回し、毎ラウンドのリスト生成を避ける。
+        サブクラスでオーバーライドすることで特定ボードテクスチャへのバイアスが可能
+        （gto_rare_training 用）。"""
+        self._round_deck.reset()
+        return self._round_deck
 
     def _all_in_run_out(self) -> bool:
         """ベット可能なアクティブプレイヤーが1人以下ならTrue（残りカードはベットなしでdeal）。"""
-        return len([p for p in self.players if p.status == 'active']) <= 1
+        return self._active_count <= 1
 
     def play_round(self):
         if not self.start_round(): return False
@@ -92,15 +98,15 @@ class Game:
         
         # BBの位置を特定
         sb_pos = (self.dealer_pos + 1) % len(self.players)
-        while self.players[sb_pos].status == 'busted':
+        while self.players[sb_pos].status == Status.BUSTED:
             sb_pos = (sb_pos + 1) % len(self.players)
         bb_pos = (sb_pos + 1) % len(self.players)
-        while self.players[bb_pos].status == 'busted':
+        while self.players[bb_pos].status == Status.BUSTED:
             bb_pos = (bb_pos + 1) % len(self.players)
             
         # BBの次から開始
         start_idx = (bb_pos + 1) % len(self.players)
-        while self.players[start_idx].status == 'busted':
+        while self.players[start_idx].status == Status.BUSTED:
             start_idx = (start_idx + 1) % len(self.players)
             
         if not self.betting_round(start_idx):
@@ -111,19 +117,20 @@ class Game:
         streets = [("フロップ", 3), ("ターン", 1), ("リバー", 1)]
         for name, count in streets:
             self._log(f"\n{Fore.BLUE}[{name}]{Style.RESET_ALL}")
-            cards = [self.deck.pop() for _ in range(count)]
+            cards = self.deck.draw_n(count)
             if name == "フロップ": self.board.set_flops(tuple(cards))
             elif name == "ターン": self.board.set_turn(cards[0])
             elif name == "リバー": self.board.set_river(cards[0])
             
-            self._log(f"ボード: [{Player.hand_output_format(self.board.get_all_cards())}]")
+            if not self.silent:
+                self._log(f"ボード: [{Player.hand_output_format(self.board.cards)}]")
 
             if self._all_in_run_out():
                 continue  # ベットをスキップして残りのカードも配る
 
             # ディーラーの次（SBの位置）から開始
             start_idx = (self.dealer_pos + 1) % len(self.players)
-            while self.players[start_idx].status == 'busted':
+            while self.players[start_idx].status == Status.BUSTED:
                 start_idx = (start_idx + 1) % len(self.players)
                 
             if not self.betting_round(start_idx):
@@ -133,12 +140,41 @@ class Game:
         self.showdown()
         return True
 
+    def _refresh_status_counts(self):
+        """contesting / active 人数のキャッシュを players から再計算する。"""
+        self._contesting_count = 0
+        self._active_count = 0
+        for p in self.players:
+            if p.status == Status.ACTIVE:
+                self._active_count += 1
+                self._contesting_count += 1
+            elif p.status == Status.ALLIN:
+                self._contesting_count += 1
+
+    def _prepare_game_state(self, game_state: dict) -> None:
+        """ストリート開始時に game_state へ追加情報を載せるためのフック（サブクラス用）。"""
+        pass
+
+    @staticmethod
+    def _compute_call(player_bet: int, round_max_bet: int) -> int:
+        """このラウンドに既に賭けた額 player_bet のプレイヤーがコールに必要な額。"""
+        return round_max_bet - player_bet
+
+    @staticmethod
+    def _legalize_raise(current_max: int, attempted: int, bb: int) -> int:
+        """レイズ先の額 attempted を最小レイズ（現在の最大ベット + BB）以上に切り上げる。"""
+        return max(attempted, current_max + bb)
+
     def betting_round(self, start_idx: int) -> bool:
         for p in self.players: p.round_bet = 0
+        # ラウンド開始時に一度だけ数え、以降は状態遷移ごとに差分更新する
+        self._refresh_status_counts()
+        # silent 時は f-string の組み立て自体を省く
+        log = not self.silent
         round_max_bet = 0
         
         # プリフロップ（ボードにカードがない）かつベットがある場合
-        is_preflop = (len(self.board.get_all_cards()) == 0)
+        is_preflop = (self.board.mask == 0)
         if is_preflop and self.current_bet > 0:
             round_max_bet = self.big_blind
             for p in self.players: p.round_bet = p.current_bet
@@ -150,7 +186,7 @@ class Game:
         _scan = start_idx
         _last_active_name = ''
         for _ in range(len(self.players)):
-            if self.players[_scan].status == 'active':
+            if self.players[_scan].status == Status.ACTIVE:
                 _last_active_name = self.players[_scan].name
             _scan = (_scan + 1) % len(self.players)
         last_to_act_name = _last_active_name
@@ -159,75 +195,101 @@ class Game:
         bb_pos = -1
         if is_preflop:
             sb_p = (self.dealer_pos + 1) % len(self.players)
-            while self.players[sb_p].status == 'busted': sb_p = (sb_p + 1) % len(self.players)
+            while self.players[sb_p].status == Status.BUSTED: sb_p = (sb_p + 1) % len(self.players)
             bb_pos = (sb_p + 1) % len(self.players)
-            while self.players[bb_pos].status == 'busted': bb_pos = (bb_pos + 1) % len(self.players)
+            while self.players[bb_pos].status == Status.BUSTED: bb_pos = (bb_pos + 1) % len(self.players)
         
+        # 意思決定ごとに作り直さず、1つの game_state を使い回して変化した値だけ更新する
+        players_view = [{'name': p_o.name, 'chips': p_o.chips, 'status': p_o.status} for p_o in self.players]
+        game_state = {
+            'board': self.board, 'pot': self.pot, 'call_amount': 0,
+            'min_raise': 0, 'max_raise_to': 0, 'valid_actions': 0,
+            'players': players_view, 'num_contesting': self._contesting_count,
+            'last_to_act_name': last_to_act_name,
+        }
+        self._prepare_game_state(game_state)
+
+        # アクション関数・観察者コールバックはラウンド開始時に一度だけ解決する
+        action_fns = [
+            getattr(p_o, 'decide_action', None) or getattr(p_o, 'get_action', None)
+            for p_o in self.players
+        ]
+        observers = [(o, o.on_opponent_action) for o in self.players if hasattr(o, 'on_opponent_action')]
+
         while True:
             p = self.players[current_idx]
-            if p.status == 'active':
-                call_amount = round_max_bet - p.round_bet
+            if p.status == Status.ACTIVE:
+                call_amount = self._compute_call(p.round_bet, round_max_bet)
                 # ── valid_actions の決定 ──
-                valid_actions = ['fold']
-                if call_amount == 0: valid_actions.append('check')
-                else: valid_actions.append('call')
+                va = FOLD | (CHECK if call_amount == 0 else CALL)
                 # 他にアクティブ（all-in でない）プレイヤーがいる場合のみ raise 可能
-                others_active = any(o.status == 'active' and o is not p for o in self.players)
-                if p.chips > call_amount and others_active: valid_actions.append('raise')
+                others_active = self._active_count > 1
+                if p.chips > call_amount and others_active: va |= RAISE
+                valid_actions = ACTIONS_FOR_MASK[va]
 
                 # 相手プレイヤーが出せる最大合計（レイズ上限の計算用）
+                # p 自身は active なので、他に残っている（active / all-in）相手がいるのは contesting が2人以上のとき
                 max_raise_to = max(
                     (o.chips + o.round_bet) for o in self.players
-                    if o.status in ('active', 'all-in') and o is not p
-                ) if others_active or any(o.status == 'all-in' for o in self.players if o is not p) else round_max_bet
-
-                game_state = {
-                    'board': self.board, 'pot': self.pot, 'call_amount': call_amount,
-                    'min_raise': round_max_bet + self.big_blind,
-                    'max_raise_to': max_raise_to,
-                    'players': [{'name': p_o.name, 'chips': p_o.chips, 'status': p_o.status} for p_o in self.players],
-                    'last_to_act_name': last_to_act_name,
-                }
+                    if o.status <= Status.ALLIN and o is not p
+                ) if self._contesting_count > 1 else round_max_bet
+
+                game_state['pot'] = self.pot
+                game_state['call_amount'] = call_amount
+                game_state['min_raise'] = round_max_bet + self.big_blind
+                game_state['max_raise_to'] = max_raise_to
+                game_state['valid_actions'] = va
+                game_state['num_contesting'] = self._contesting_count
                 
                 # アクション取得
-                if hasattr(p, 'decide_action'): action, amount = p.decide_action(valid_actions, game_state)
-                else: action, amount = p.get_action(valid_actions, game_state)
+                action, amount = action_fns[current_idx](valid_actions, game_state)
 
                 # 表示ロジック
-                name_fmt = f"{Fore.CYAN}{p.name:^7}{Style.RESET_ALL}"
+                name_fmt = f"{Fore.CYAN}{p.name:^7}{Style.RESET_ALL}" if log else ''
                 if action == 'fold':
-                    self._log(f"[{name_fmt}] {Fore.RED}fold{Style.RESET_ALL}")
-                    p.status = 'folded'
+                    if log: self._log(f"[{name_fmt}] {Fore.RED}fold{Style.RESET_ALL}")
+                    p.status = Status.FOLDED
                 elif action == 'check':
-                    self._log(f"[{name_fmt}] check")
+                    if log: self._log(f"[{name_fmt}] check")
                     p.pay(0)
                 elif action == 'call':
                     pay_amt = p.pay(call_amount)
                     p.round_bet += pay_amt
                     self.pot += pay_amt
-                    self._log(f"[{name_fmt}] {Fore.BLUE}call{Style.RESET_ALL} (支払: {pay_amt})")
+                    if log: self._log(f"[{name_fmt}] {Fore.BLUE}call{Style.RESET_ALL} (支払: {pay_amt})")
                 elif action == 'raise':
                     old_round_max = round_max_bet
-                    actual_raise_to = max(amount, round_max_bet + self.big_blind)
+                    actual_raise_to = self._legalize_raise(round_max_bet, amount, self.big_blind)
                     pay_amt = p.pay(actual_raise_to - p.round_bet)
                     p.round_bet += pay_amt
                     self.pot += pay_amt
                     round_max_bet = p.round_bet
                     increment = round_max_bet - old_round_max
                     last_raiser = current_idx
-                    action_label = "bet" if call_amount == 0 else "raise"
-                    self._log(f"[{name_fmt}] {Fore.YELLOW}{action_label:5}{Style.RESET_ALL} {round_max_bet} (+{increment})")
+                    if log:
+                        action_label = "bet" if call_amount == 0 else "raise"
+                        self._log(f"[{name_fmt}] {Fore.YELLOW}{action_label:5}{Style.RESET_ALL} {round_max_bet} (+{increment})")
+
+                # fold / all-in で active から外れたらキャッシュを更新
+                if p.status != Status.ACTIVE:
+                    self._active_count -= 1
+                    if p.status == Status.FOLDED: self._contesting_count -= 1
 
                 # アクション後に観察者へ通知（on_opponent_action を持つプレイヤー）
-                for obs in self.players:
-                    if obs is not p and obs.status not in ('folded', 'busted') and hasattr(obs, 'on_opponent_action'):
-                        obs.on_opponent_action(p.name, action, amount, game_state)
+                for obs, on_action in observers:
+                    if obs is not p and obs.status <= Status.ALLIN:
+                        on_action(p.name, action, amount, game_state)
+
+                # 状態が変わるのはアクションしたプレイヤーだけ
+                view = players_view[current_idx]
+                view['chips'] = p.chips
+                view['status'] = p.status
 
-            if len(self.get_contesting_players()) == 1: return False
+            if self._contesting_count == 1: return False
             next_idx = (current_idx + 1) % len(self.players)
             
             # 全員がフォールドまたはオールインでアクティブなプレイヤーがいない場合
-            if len([p for p in self.players if p.status == 'active']) == 0: break
+            if self._active_count == 0: break
             
             # レイズがあった場合、レイザーの右隣まで回ったら終了
             if last_raiser != -1:
@@ -252,19 +314,26 @@ class Game:
         self.move_dealer()
 
     def showdown(self):
-        self._log(f"\n{Fore.MAGENTA}--- ショーダウン ---{Style.RESET_ALL}")
+        # 表示行はまとめて1回で出力する
+        lines = [f"\n{Fore.MAGENTA}--- ショーダウン ---{Style.RESET_ALL}"] if not self.silent else None
         contesting = self.get_contesting_players()
-        evaluated_hands = []
+        # players と同じ並びのスコア（ショーダウン対象外は -1）
+        values = [-1] * len(self.players)
+        seat = {p: i for i, p in enumerate(self.players)}
+        board_ints = [c.int_id for c in self.board.iter_cards()]
         for p in contesting:
             if p.hand:
-                ev_hand = evaluate_hand(p.hand, self.board)
-                evaluated_hands.append({'ev': ev_hand, 'player': p})
+                # 勝敗判定はテーブル評価のスコアのみで行う
+                score = eval7([c.int_id for c in p.hand.cards] + board_ints)
+                values[seat[p]] = score
                 
-                # 手札とベスト5枚の表示
-                h_str = Player.hand_output_format(p.hand.cards)
-                best_str = Player.hand_output_format(ev_hand.best_cards)
-                self._log(f"{Fore.CYAN}{p.name:^7}{Style.RESET_ALL}: [{h_str}]")
-                self._log(f"  -> {Fore.MAGENTA}{ev_hand.hand_type:15}{Style.RESET_ALL} [{best_str}]")
+                # 手札とベスト5枚の表示（役名・ベスト5枚が要るのは表示時だけ）
+                if not self.silent:
+                    ev_hand = evaluate_hand(p.hand, self.board)
+                    h_str = Player.hand_output_format(p.hand.cards)
+                    best_str = Player.hand_output_format(ev_hand.best_cards)
+                    lines.append(f"{Fore.CYAN}{p.name:^7}{Style.RESET_ALL}: [{h_str}]")
+                    lines.append(f"  -> {Fore.MAGENTA}{ev_hand.hand_type:15}{Style.RESET_ALL} [{best_str}]")
 
         # ショーダウン手牌を観察者へ通知（on_showdown_hand を持つプレイヤー）
         for p in contesting:
@@ -273,42 +342,69 @@ class Game:
                     if observer is not p and hasattr(observer, 'on_showdown_hand'):
                         observer.on_showdown_hand(p.name, p.hand)
 
-        # 役の強さでソート
-        evaluated_hands.sort(key=lambda x: x['ev'].value, reverse=True)
-        contributions = {p: p.current_bet for p in self.players}
-        
-        while self.pot > 0:
-            best_val = -1
-            winners = []
-            for item in evaluated_hands:
-                p = item['player']
-                if contributions[p] > 0:
-                    if best_val == -1:
-                        best_val = item['ev'].value
-                        winners.append(p)
-                    elif item['ev'].value == best_val:
-                        winners.append(p)
-            if not winners: break
-
-            max_per_winner = min(contributions[w] for w in winners)
-            total_winnable = 0
-            for p in self.players:
-                can_take = min(contributions[p], max_per_winner)
-                total_winnable += can_take
-                contributions[p] -= can_take
-                self.pot -= can_take
-            
+        pots = _build_side_pots([p.current_bet for p in self.players], values)
+
+        for winners_idx, total_winnable in pots:
+            if self.pot <= 0: break
+            self.pot -= total_winnable
+            winners = [self.players[i] for i in winners_idx]
             share = total_winnable // len(winners)
             for w in winners:
-                self._log(f"{Fore.GREEN}{w.name} がポット {share} を獲得しました！{Style.RESET_ALL}")
+                if lines is not None:
+                    lines.append(f"{Fore.GREEN}{w.name} がポット {share} を獲得しました！{Style.RESET_ALL}")
                 w.receive_winnings(share)
             if total_winnable % len(winners) != 0:
                 winners[0].receive_winnings(total_winnable % len(winners))
 
+        if lines is not None:
+            self._log("\n".join(lines))
         self.move_dealer()
 
 
     def move_dealer(self):
         self.dealer_pos = (self.dealer_pos + 1) % len(self.players)
-        while self.players[self.dealer_pos].status == 'busted':
+        while self.players[self.dealer_pos].status == Status.BUSTED:
             self.dealer_pos = (self.dealer_pos + 1) % len(self.players)
+
+
+def _build_side_pots(bets: list[int], values: list[int]) -> list[list]:
+    """
+    拠出額 bets とショーダウンのスコア values（対象外は -1）から [勝者の席番号リスト, 金額] の列を作る。
+
+    拠出額の段階（level）ごとの取り分 (level - prev) × (拠出 >= level の人数) は、
+    その段階まで拠出したショーダウン参加者のうち最高スコアの勝者が得る。勝者が同じ段階は1つにまとめる。
+    席を拠出額でソートすると「拠出 >= level の席」は後ろ側の連続区間になるので、
+    後ろから1回走査して各段階の勝者を求め、前から金額を積む（O(P log P)）。
+    """
+    n = len(bets)
+    order = sorted(range(n), key=bets.__getitem__)
+    # 高い段階から: (level, 勝者の席番号リスト, 拠出 >= level の人数)
+    levels: list[tuple[int, list[int], int]] = []
+    best_val = -1
+    winners: list[int] = []
+    j = n - 1
+    while j >= 0 and bets[order[j]] > 0:
+        level = bets[order[j]]
+        while j >= 0 and bets[order[j]] == level:
+            i = order[j]
+            v = values[i]
+            if v >= 0:
+                if v > best_val:
+                    best_val = v
+                    winners = [i]
+                elif v == best_val:
+                    winners.append(i)
+            j -= 1
+        levels.append((level, sorted(winners), n - 1 - j))
+
+    pots: list[list] = []
+    prev = 0
+    for level, winners_idx, eligible in reversed(levels):
+        if not winners_idx: break
+        amount = (level - prev) * eligible
+        if pots and pots[-1][0] == winners_idx:
+            pots[-1][1] += amount
+        else:
+            pots.append([winners_idx, amount])
+        prev = level
+    return pots
@@ -10,12 +10,52 @@ import json
 import os
 import tempfile
 import warnings
-from collections import defaultdict
+import zipfile
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from gto_strategy import heuristic_strategy
 
-# JSONフォーマットのバージョン。状態キー形式が変わるたびに増やす
-_FORMAT_VERSION = 4
+# 保存フォーマットのバージョン。状態キー形式・アクション列が変わるたびに増やす
+# v4: JSON（dict of dict）/ v5: npz（状態 × アクションの配列）
+# v6: v5 と同じ配列で、状態キーを改行区切りの UTF-8 バイト列（uint8）で持つ
+_FORMAT_VERSION = 6
+# 読み込める（状態キーが固定長 Unicode 配列の）旧 npz フォーマット
+_NPZ_V5 = 5
+_LEGACY_JSON_VERSION = 4
+
+# CFR のアクション空間（配列の列順）。'raise' は展開前の名前が来ても落ちないように残す
+ACTIONS: tuple[str, ...] = (
+    'fold', 'check', 'call', 'raise', 'raise_33', 'raise_67', 'raise_100', 'raise_200',
+)
+_ACTION_IDX: dict[str, int] = {a: i for i, a in enumerate(ACTIONS)}
+_N_ACTIONS = len(ACTIONS)
+
+# 状態配列の初期行数（足りなくなったら倍に伸ばす）
+_INITIAL_CAPACITY = 4096
+
+# 差分ログ（<save_path>.delta）の各レコード先頭に置く識別子
+# （レコード形式は v5 から変わっていないので識別子も v5 のまま）
+_DELTA_MAGIC = 0x5446_4C44_4346_5200 | _NPZ_V5
+# 差分ログがこのサイズとスナップショットのサイズの両方を超えたらスナップショットに畳み込む
+_COMPACT_MIN_BYTES = 1 << 20
+
+
+# スナップショットの deflate レベル。既定の 6 より保存が 3 倍ほど速く、サイズは 4 割ほど増えるだけ
+_NPZ_COMPRESSLEVEL = 1
+
+
+def _write_npz(f, **arrays: np.ndarray) -> None:
+    """np.savez_compressed と同じ npz を、圧縮レベルを指定して f に書き出す（np.load でそのまま読める）"""
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=_NPZ_COMPRESSLEVEL) as zf:
+        for name, arr in arrays.items():
+            with zf.open(name + '.npy', 'w', force_zip64=True) as out:
+                np.lib.format.write_array(out, np.asanyarray(arr), allow_pickle=False)
 
 
 class SimpleMCCFR:
@@ -23,11 +63,15 @@ class SimpleMCCFR:
     各ゲーム状態（state_key）ごとに累積後悔（regret）と
     累積戦略（strategy）を管理する Regret Matching エンジン。
 
+    state_key は _state_id で行番号に変換し、後悔・戦略・訪問回数は
+    (状態数, len(ACTIONS)) の numpy 配列で保持する。
+
     学習サイクル:
         1. get_strategy() でアクション確率を取得
         2. アクションを実行してゲーム結果を観測
         3. update_regret() で後悔を更新
-        4. save() で JSON に書き出し（次セッションで引き継ぎ）
+        4. save() で npz に書き出し（次セッションで引き継ぎ）
+           毎ラウンドの保存は log_delta() で変更行だけを <path>.delta に追記する
     """
 
     # この訪問回数を超えたら CFR 戦略を使う（それ以下はヒューリスティック）
@@ -37,17 +81,104 @@ class SimpleMCCFR:
     _AVG_STRATEGY_THRESHOLD = 100
 
     def __init__(self) -> None:
-        # {state_key: {action: 累積後悔}}
-        self.regret_sum: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-        # {state_key: {action: 累積戦略確率}}
-        self.strategy_sum: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-        # {state_key: 訪問回数}
-        self.visit_count: dict[str, int] = defaultdict(int)
+        # {state_key: 行番号}
+        self._state_id: dict[str, int] = {}
+        # 行番号 → state_key（保存・dict 変換用）
+        self._state_keys: list[str] = []
+        # [行, アクション] の累積後悔 / 累積戦略確率
+        self._regrets = np.zeros((_INITIAL_CAPACITY, _N_ACTIONS), dtype=np.float64)
+        self._strategy = np.zeros((_INITIAL_CAPACITY, _N_ACTIONS), dtype=np.float64)
+        # [行] の訪問回数
+        self._visits = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        # 最後の save() / log_delta() 以降に変更された行
+        self._dirty: set[int] = set()
+
+    # ──────────────────────────────────────────────
+    # 状態行の管理
+    # ──────────────────────────────────────────────
+
+    def _row(self, state_key: str) -> int:
+        """state_key の行番号を返す（未登録なら行を確保する）"""
+        row = self._state_id.get(state_key)
+        if row is not None:
+            return row
+        row = len(self._state_keys)
+        if row == self._visits.shape[0]:
+            self._grow()
+        self._state_id[state_key] = row
+        self._state_keys.append(state_key)
+        return row
+
+    def _rows(self, state_keys: list[str]) -> list[int] | slice:
+        """
+        state_keys の行番号をまとめて返す（未登録なら行を確保する）。
+        空のテーブルへの一括登録（load 直後など）は dict をまとめて作り、行を slice で返す。
+        """
+        if self._state_keys:
+            return [self._row(k) for k in state_keys]
+        n = len(state_keys)
+        while self._visits.shape[0] < n:
+            self._grow()
+        self._state_keys.extend(state_keys)
+        self._state_id.update(zip(state_keys, range(n)))
+        return slice(0, n)
+
+    def _grow(self) -> None:
+        """配列の行数を倍にする"""
+        cap = self._visits.shape[0] * 2
+        for name in ('_regrets', '_strategy'):
+            old = getattr(self, name)
+            new = np.zeros((cap, _N_ACTIONS), dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+        visits = np.zeros(cap, dtype=self._visits.dtype)
+        visits[:self._visits.shape[0]] = self._visits
+        self._visits = visits
+
+    def clear(self) -> None:
+        """全状態を消して空のテーブルに戻す（確保済みの配列はそのまま使い回す）"""
+        n = len(self._state_keys)
+        self._regrets[:n] = 0.0
+        self._strategy[:n] = 0.0
+        self._visits[:n] = 0
+        self._state_id.clear()
+        self._state_keys.clear()
+        self._dirty.clear()
+
+    def __len__(self) -> int:
+        """登録済みの状態数"""
+        return len(self._state_keys)
+
+    def visits(self, state_key: str) -> int:
+        """state_key の訪問回数（未登録なら 0）"""
+        row = self._state_id.get(state_key)
+        return 0 if row is None else int(self._visits[row])
+
+    def visit_counts(self) -> dict[str, int]:
+        """{state_key: 訪問回数}（訪問のある状態のみ）"""
+        n = len(self._state_keys)
+        visits = self._visits[:n].tolist()
+        return {k: v for k, v in zip(self._state_keys, visits) if v > 0}
 
     # ──────────────────────────────────────────────
     # 戦略の取得
     # ──────────────────────────────────────────────
 
+    def regret_matching(self, state_key: str, valid_actions: list[str]) -> dict[str, float] | None:
+        """
+        正の累積後悔から現在の戦略を返す（訪問回数は触らない）。
+        正の後悔が1つもなければ None。
+        """
+        row = self._state_id.get(state_key)
+        if row is None:
+            return None
+        idx = [_ACTION_IDX[a] for a in valid_actions]
+        positive = np.maximum(self._regrets[row, idx], 0.0)
+        total = positive.sum()
+        if total <= 0:
+            return None
+        return dict(zip(valid_actions, (positive / total).tolist()))
+
     def get_strategy(
         self,
         state_key: str,
@@ -64,9 +195,12 @@ class SimpleMCCFR:
         訪問回数が閾値未満のうちはヒューリスティックにフォールバック。
         strategy_sum の蓄積は LEARN_THRESHOLD 到達後のみ（ヒューリスティック期間を除外）。
         """
-        self.visit_count[state_key] += 1
+        row = self._row(state_key)
+        self._visits[row] += 1
+        self._dirty.add(row)
+        visits = self._visits[row]
 
-        if self.visit_count[state_key] < self._LEARN_THRESHOLD:
+        if visits < self._LEARN_THRESHOLD:
             return heuristic_strategy(
                 eq_bucket, valid_actions,
                 num_players=num_players, state_key=state_key,
@@ -75,13 +209,8 @@ class SimpleMCCFR:
             )
 
         # Regret Matching: 正の後悔のみを使用して現在戦略を計算
-        regrets = self.regret_sum[state_key]
-        positive = {a: max(regrets.get(a, 0.0), 0.0) for a in valid_actions}
-        total = sum(positive.values())
-
-        if total > 0:
-            current_strategy = {a: positive[a] / total for a in valid_actions}
-        else:
+        current_strategy = self.regret_matching(state_key, valid_actions)
+        if current_strategy is None:
             current_strategy = heuristic_strategy(
                 eq_bucket, valid_actions,
                 num_players=num_players, state_key=state_key,
@@ -90,15 +219,15 @@ class SimpleMCCFR:
             )
 
         # 平均戦略の累積（LEARN_THRESHOLD 以降のみ: ヒューリスティック期間を含まない）
-        for a in valid_actions:
-            self.strategy_sum[state_key][a] += current_strategy[a]
+        idx = [_ACTION_IDX[a] for a in valid_actions]
+        self._strategy[row, idx] += [current_strategy[a] for a in valid_actions]
 
         # 十分学習された状態では平均戦略でプレイ（CFR 理論上の均衡戦略）
-        if self.visit_count[state_key] >= self._AVG_STRATEGY_THRESHOLD:
-            avg = self.strategy_sum[state_key]
-            avg_total = sum(avg.get(a, 0.0) for a in valid_actions)
+        if visits >= self._AVG_STRATEGY_THRESHOLD:
+            avg = self._strategy[row, idx]
+            avg_total = avg.sum()
             if avg_total > 0:
-                return {a: avg.get(a, 0.0) / avg_total for a in valid_actions}
+                return dict(zip(valid_actions, (avg / avg_total).tolist()))
 
         return current_strategy
 
@@ -119,21 +248,107 @@ class SimpleMCCFR:
             取ったアクションより良かったアクションは正の後悔、
             悪かったアクションは負の後悔として蓄積する。
         """
+        if not action_values:
+            return
+        row = self._row(state_key)
         taken_value = action_values.get(taken_action, 0.0)
-        for action, value in action_values.items():
-            self.regret_sum[state_key][action] += value - taken_value
-            # CFR+: 負の累積後悔を 0 にリセット（収束速度を向上）
-            if self.regret_sum[state_key][action] < 0:
-                self.regret_sum[state_key][action] = 0.0
+        idx = [_ACTION_IDX[a] for a in action_values]
+        values = np.fromiter(action_values.values(), dtype=np.float64, count=len(idx))
+        # CFR+: 負の累積後悔を 0 にリセット（収束速度を向上）
+        self._regrets[row, idx] = np.maximum(self._regrets[row, idx] + (values - taken_value), 0.0)
+        self._dirty.add(row)
 
     def update_strategy_sum(self, state_key: str, strategy: dict[str, float]) -> None:
         """
         strategy_sum を直接更新する（realtime resolve 等から呼ぶ用）。
         LEARN_THRESHOLD 以降に達した状態のみ蓄積する。
         """
-        if self.visit_count.get(state_key, 0) >= self._LEARN_THRESHOLD:
-            for a, prob in strategy.items():
-                self.strategy_sum[state_key][a] += prob
+        row = self._state_id.get(state_key)
+        if row is not None and self._visits[row] >= self._LEARN_THRESHOLD:
+            idx = [_ACTION_IDX[a] for a in strategy]
+            self._strategy[row, idx] += list(strategy.values())
+            self._dirty.add(row)
+
+    # ──────────────────────────────────────────────
+    # 配列単位の入出力（共有メモリ経由の並列 selfplay 用）
+    # ──────────────────────────────────────────────
+
+    def arrays(self) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+        """(state_key の列, regret_sum, strategy_sum, visit_count) を返す（配列は内部のビュー）"""
+        n = len(self._state_keys)
+        return self._state_keys, self._regrets[:n], self._strategy[:n], self._visits[:n]
+
+    def load_arrays(self, keys: list[str], regrets: np.ndarray,
+                    strategy: np.ndarray, visits: np.ndarray) -> None:
+        """keys の各状態の行を与えられた値で上書きする"""
+        rows = [self._row(k) for k in keys]
+        self._regrets[rows] = regrets
+        self._strategy[rows] = strategy
+        self._visits[rows] = visits
+        self._dirty.update(rows)
+
+    def add_arrays(self, keys: list[str], regrets: np.ndarray,
+                   strategy: np.ndarray, visits: np.ndarray) -> None:
+        """keys の各状態の行に差分を足し込む（後悔は CFR+ と同じく 0 で下限を切る）"""
+        rows = [self._row(k) for k in keys]
+        self._regrets[rows] = np.maximum(self._regrets[rows] + regrets, 0.0)
+        self._strategy[rows] += strategy
+        self._visits[rows] += visits
+        self._dirty.update(rows)
+
+    def delta_since(self, n_base: int, regrets: np.ndarray, strategy: np.ndarray,
+                    visits: np.ndarray) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        load_arrays() で読み込んだ基準値（先頭 n_base 行）からの差分を返す。
+        n_base 行目以降は新しく登録された状態なので値そのものが差分になる。変化のない行は省く。
+        """
+        keys, cur_r, cur_s, cur_v = self.arrays()
+        d_r = cur_r.copy()
+        d_s = cur_s.copy()
+        d_v = cur_v.copy()
+        d_r[:n_base] -= regrets
+        d_s[:n_base] -= strategy
+        d_v[:n_base] -= visits
+        changed = np.flatnonzero((d_v != 0) | np.any(d_r != 0, axis=1) | np.any(d_s != 0, axis=1))
+        return [keys[i] for i in changed.tolist()], d_r[changed], d_s[changed], d_v[changed]
+
+    # ──────────────────────────────────────────────
+    # dict 形式との相互変換（プロセス間マージ用）
+    # ──────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        """
+        {'regret_sum': {state: {action: v}}, 'strategy_sum': ..., 'visit_count': {state: n}}
+        の形で書き出す（0 の要素は省く）。
+        """
+        n = len(self._state_keys)
+        regret_sum: dict[str, dict[str, float]] = {}
+        strategy_sum: dict[str, dict[str, float]] = {}
+        for out, arr in ((regret_sum, self._regrets[:n]), (strategy_sum, self._strategy[:n])):
+            rows, cols = np.nonzero(arr)
+            vals = arr[rows, cols].tolist()
+            for r, c, v in zip(rows.tolist(), cols.tolist(), vals):
+                out.setdefault(self._state_keys[r], {})[ACTIONS[c]] = v
+        return {
+            'regret_sum': regret_sum,
+            'strategy_sum': strategy_sum,
+            'visit_count': self.visit_counts(),
+        }
+
+    def update_from_dict(self, data: dict) -> None:
+        """to_dict() 形式のデータで該当する状態の値を上書きする"""
+        for key in ('regret_sum', 'strategy_sum'):
+            for state_key, actions in data.get(key, {}).items():
+                row = self._row(state_key)
+                # _row が配列を伸ばした場合に備えて毎回取り直す
+                arr = self._regrets if key == 'regret_sum' else self._strategy
+                arr[row] = 0.0
+                for a, v in actions.items():
+                    arr[row, _ACTION_IDX[a]] = float(v)
+        for state_key, count in data.get('visit_count', {}).items():
+            # _row が配列を伸ばすので、行番号を先に取ってから書き込む
+            row = self._row(state_key)
+            self._visits[row] = int(count)
 
     # ──────────────────────────────────────────────
     # 永続化
@@ -143,24 +358,29 @@ class SimpleMCCFR:
         if path == os.devnull:
             return
 
-        def _trim(d: dict) -> dict:
-            return {k: round(v, 3) for k, v in d.items()}
-
-        data = {
-            '_version': _FORMAT_VERSION,
-            'regret_sum':   {k: _trim(dict(v)) for k, v in self.regret_sum.items()},
-            'strategy_sum': {k: _trim(dict(v)) for k, v in self.strategy_sum.items()},
-            'visit_count':  dict(self.visit_count),
-        }
-
+        n = len(self._state_keys)
         dir_name = os.path.dirname(os.path.abspath(path))
         try:
             with tempfile.NamedTemporaryFile(
-                'w', dir=dir_name, suffix='.tmp', delete=False, encoding='utf-8'
+                'wb', dir=dir_name, suffix='.tmp', delete=False
             ) as f:
                 tmp_path = f.name
-                json.dump(data, f, ensure_ascii=False)
+                _write_npz(
+                    f,
+                    version=np.array(_FORMAT_VERSION),
+                    actions=np.array(ACTIONS),
+                    # 固定長 Unicode 配列は最長キーに揃えて 1 文字 4 バイトになるので、バイト列で持つ
+                    states=np.frombuffer('\n'.join(self._state_keys).encode('utf-8'), dtype=np.uint8),
+                    regret_sum=self._regrets[:n],
+                    strategy_sum=self._strategy[:n],
+                    visit_count=self._visits[:n],
+                )
             os.replace(tmp_path, path)
+            # スナップショットが全状態を含むので、差分ログは不要になる
+            delta = self._delta_path(path)
+            if os.path.exists(delta):
+                os.unlink(delta)
+            self._dirty.clear()
         except Exception:
             try:
                 os.unlink(tmp_path)
@@ -168,17 +388,128 @@ class SimpleMCCFR:
                 pass
             raise
 
+    @staticmethod
+    def _delta_path(path: str) -> str:
+        return path + '.delta'
+
+    def log_delta(self, path: str) -> None:
+        """
+        前回の save() / log_delta() 以降に変更された行だけを <path>.delta に追記する。
+
+        1レコード = ヘッダ int64[3]（識別子, 行数, キー長）+ 改行区切りの state_key（UTF-8）
+                    + regret_sum / strategy_sum（float64[行数, len(ACTIONS)]）+ visit_count（int64[行数]）。
+        値は差分ではなく行の現在値なので、load() で先頭から上書きしていけば復元できる。
+        差分ログが _COMPACT_MIN_BYTES とスナップショットの両方より大きくなったら save() で畳み込む。
+        """
+        if path == os.devnull or not self._dirty:
+            return
+        rows = sorted(self._dirty)
+        keys = '\n'.join(self._state_keys[r] for r in rows).encode('utf-8')
+        header = np.array([_DELTA_MAGIC, len(rows), len(keys)], dtype=np.int64)
+        delta = self._delta_path(path)
+        with open(delta, 'ab') as f:
+            f.write(header.tobytes())
+            f.write(keys)
+            f.write(self._regrets[rows].tobytes())
+            f.write(self._strategy[rows].tobytes())
+            f.write(self._visits[rows].tobytes())
+        self._dirty.clear()
+
+        snapshot_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if os.path.getsize(delta) > max(_COMPACT_MIN_BYTES, snapshot_size):
+            self.save(path)
+
+    def _replay_delta(self, delta: str) -> None:
+        """log_delta() の差分ログを先頭から適用する（途中で壊れていればそこで止める）"""
+        with open(delta, 'rb') as f:
+            buf = f.read()
+        row_bytes = _N_ACTIONS * 8
+        pos = 0
+        while pos < len(buf):
+            if pos + 24 > len(buf):
+                break
+            magic, count, key_len = np.frombuffer(buf, dtype=np.int64, count=3, offset=pos).tolist()
+            end = pos + 24 + key_len + count * (2 * row_bytes + 8)
+            if magic != _DELTA_MAGIC or end > len(buf):
+                break
+            pos += 24
+            keys = buf[pos:pos + key_len].decode('utf-8').split('\n')
+            pos += key_len
+            regrets = np.frombuffer(buf, dtype=np.float64, count=count * _N_ACTIONS, offset=pos)
+            pos += count * row_bytes
+            strategy = np.frombuffer(buf, dtype=np.float64, count=count * _N_ACTIONS, offset=pos)
+            pos += count * row_bytes
+            visits = np.frombuffer(buf, dtype=np.int64, count=count, offset=pos)
+            pos += count * 8
+            rows = [self._row(k) for k in keys]
+            self._regrets[rows] = regrets.reshape(count, _N_ACTIONS)
+            self._strategy[rows] = strategy.reshape(count, _N_ACTIONS)
+            self._visits[rows] = visits
+        if pos < len(buf):
+            warnings.warn(
+                f"{os.path.basename(delta)} の末尾が壊れているため、途中までを読み込みました。",
+                UserWarning,
+                stacklevel=3,
+            )
+
     def load(self, path: str) -> None:
+        delta = self._delta_path(path)
         if not os.path.exists(path):
+            # 旧フォーマット（同名の .json）があれば移行する
+            legacy = os.path.splitext(path)[0] + '.json'
+            if legacy != path and os.path.exists(legacy):
+                self._load_legacy_json(legacy)
+            if os.path.exists(delta):
+                self._replay_delta(delta)
             return
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with np.load(path, allow_pickle=False) as data:
+                file_version = int(data['version'])
+                file_actions = tuple(data['actions'].tolist())
+                if file_version not in (_FORMAT_VERSION, _NPZ_V5) or file_actions != ACTIONS:
+                    warnings.warn(
+                        f"{os.path.basename(path)} のバージョンが異なります "
+                        f"(ファイル: v{file_version}, 現在: v{_FORMAT_VERSION})。"
+                        "学習データをリセットして新規開始します。",
+                        UserWarning,
+                        stacklevel=2,
+                    )
+                    return
+                if file_version == _NPZ_V5:
+                    states = data['states'].tolist()
+                else:
+                    raw = data['states'].tobytes()
+                    states = raw.decode('utf-8').split('\n') if raw else []
+                regrets = data['regret_sum']
+                strategy = data['strategy_sum']
+                visits = data['visit_count']
+        except (OSError, KeyError, ValueError) as e:
+            warnings.warn(
+                f"{os.path.basename(path)} の読み込みに失敗しました ({e})。"
+                "学習データをリセットして新規開始します。",
+                UserWarning,
+                stacklevel=2,
+            )
+            return
+
+        rows = self._rows(states)
+        self._regrets[rows] = regrets
+        self._strategy[rows] = strategy
+        self._visits[rows] = visits
+        if os.path.exists(delta):
+            self._replay_delta(delta)
+
+    def _load_legacy_json(self, path: str) -> None:
+        """v4 の JSON（dict of dict）を読み込む"""
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
 
             file_version = data.get('_version', 0)
-            if file_version != _FORMAT_VERSION:
+            if file_version != _LEGACY_JSON_VERSION:
                 warnings.warn(
-                    f"gto_strategy.json のバージョンが異なります "
+                    f"{os.path.basename(path)} のバージョンが異なります "
                     f"(ファイル: v{file_version}, 現在: v{_FORMAT_VERSION})。"
                     "学習データをリセットして新規開始します。",
                     UserWarning,
@@ -186,17 +517,11 @@ class SimpleMCCFR:
                 )
                 return
 
-            for k, v in data.get('regret_sum', {}).items():
-                self.regret_sum[k] = defaultdict(float, {ak: float(av) for ak, av in v.items()})
-            for k, v in data.get('strategy_sum', {}).items():
-                self.strategy_sum[k] = defaultdict(float, {ak: float(av) for ak, av in v.items()})
-            for k, v in data.get('visit_count', {}).items():
-                self.visit_count[k] = int(v)
+            self.update_from_dict(data)
         except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
             warnings.warn(
-                f"gto_strategy.json の読み込みに失敗しました ({e})。"
+                f"{os.path.basename(path)} の読み込みに失敗しました ({e})。"
                 "学習データをリセットして新規開始します。",
                 UserWarning,
                 stacklevel=2,
             )
-
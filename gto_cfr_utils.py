@@ -1,77 +1,75 @@
 """
 gto_cfr_utils.py
 
-CFR データのマージ・ロード・保存に関する共通ユーティリティ。
-gto_selfplay.py と gto_rare_training.py の重複コードを集約する。
+CFR データのプロセス間受け渡しと、並列ワーカー数に関する共通ユーティリティ。
+gto_selfplay.py と gto_rare_training.py から使う。
 """
 from __future__ import annotations
 
-from collections import defaultdict
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
 
 from gto_cfr import SimpleMCCFR
 
 
-def merge_cfr_data(results: list[dict]) -> dict:
+# ──────────────────────────────────────────────
+# ワーカー数
+# ──────────────────────────────────────────────
+
+def available_cpus() -> int:
     """
-    複数プロセスの CFR 結果を合算してマージする。
-    CFR は独立したシミュレーションの regret を足し合わせることで
-    等価な学習効果が得られる。
+    このプロセスが実際に使える CPU 数（--workers のデフォルト）。
+    Linux では CPU アフィニティ（taskset / コンテナの cpuset）を反映し、
+    それ以外の OS では論理 CPU 数を返す。
     """
-    regret:   dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-    strategy: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-    visits:   dict[str, int] = defaultdict(int)
-
-    for result in results:
-        for state, actions in result["regret_sum"].items():
-            for action, value in actions.items():
-                regret[state][action] += value
-        for state, actions in result["strategy_sum"].items():
-            for action, value in actions.items():
-                strategy[state][action] += value
-        for state, count in result["visit_count"].items():
-            visits[state] += count
-
-    return {
-        "regret_sum":   {k: dict(v) for k, v in regret.items()},
-        "strategy_sum": {k: dict(v) for k, v in strategy.items()},
-        "visit_count":  dict(visits),
-    }
-
-
-def apply_merged_data(cfr: SimpleMCCFR, data: dict) -> None:
-    """マージ済みデータを SimpleMCCFR インスタンスに書き込む"""
-    for k, v in data["regret_sum"].items():
-        cfr.regret_sum[k] = defaultdict(float, v)
-    for k, v in data["strategy_sum"].items():
-        cfr.strategy_sum[k] = defaultdict(float, v)
-    for k, v in data["visit_count"].items():
-        cfr.visit_count[k] = v
-
-
-def load_base(save_path: str) -> dict:
-    """既存の学習データをマージ用の dict として読み込む"""
-    base_cfr = SimpleMCCFR()
-    base_cfr.load(save_path)
-    return {
-        "regret_sum":   {k: dict(v) for k, v in base_cfr.regret_sum.items()},
-        "strategy_sum": {k: dict(v) for k, v in base_cfr.strategy_sum.items()},
-        "visit_count":  dict(base_cfr.visit_count),
-    }
-
-
-def save_merged(results: list[dict], save_path: str) -> int:
-    """マージして保存。学習済み状態数を返す"""
-    merged = merge_cfr_data(results)
-    final_cfr = SimpleMCCFR()
-    apply_merged_data(final_cfr, merged)
-    final_cfr.save(save_path)
-    return len(merged["visit_count"])
-
-
-def cfr_to_dict(cfr: SimpleMCCFR) -> dict:
-    """SimpleMCCFR インスタンスをマージ用 dict に変換する"""
-    return {
-        "regret_sum":   {k: dict(v) for k, v in cfr.regret_sum.items()},
-        "strategy_sum": {k: dict(v) for k, v in cfr.strategy_sum.items()},
-        "visit_count":  dict(cfr.visit_count),
-    }
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# ──────────────────────────────────────────────
+# 共有メモリ上のスナップショット（並列 selfplay 用）
+# ──────────────────────────────────────────────
+
+_SHARED_FIELDS = ("keys", "regret_sum", "strategy_sum", "visit_count")
+
+
+def publish_shared(cfr: SimpleMCCFR) -> tuple[list[SharedMemory], dict]:
+    """
+    CFR テーブルを共有メモリに書き出す。
+    (後で release_shared に渡すブロック, ワーカーへ渡すメタ情報) を返す。
+    メタ情報はブロック名・形状・dtype だけなので pickle が軽い。
+    """
+    keys, regrets, strategy, visits = cfr.arrays()
+    key_bytes = np.frombuffer("\n".join(keys).encode("utf-8"), dtype=np.uint8)
+    blocks: list[SharedMemory] = []
+    meta: dict = {"n": len(keys)}
+    for field, arr in zip(_SHARED_FIELDS, (key_bytes, regrets, strategy, visits)):
+        shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        meta[field] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, meta
+
+
+def attach_shared(meta: dict) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+    """publish_shared のスナップショットを読み出す（各配列はプロセス内にコピーする）"""
+    out = {}
+    for field in _SHARED_FIELDS:
+        name, shape, dtype = meta[field]
+        shm = SharedMemory(name=name, track=False)
+        try:
+            out[field] = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+    keys = out["keys"].tobytes().decode("utf-8").split("\n") if meta["n"] else []
+    return keys, out["regret_sum"], out["strategy_sum"], out["visit_count"]
+
+
+def release_shared(blocks: list[SharedMemory]) -> None:
+    """publish_shared で確保した共有メモリを解放する"""
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
@@ -15,18 +15,22 @@ import os
 import random
 from typing import Any
 
-from player import CpuAgent
+from player import CpuAgent, count_opponents
 from card import Board
-from fast_eval import calculate_equity_fast
 from gto_strategy import (
     build_state_key, get_equity_bucket, get_street, heuristic_strategy,
     get_hand_potential, compute_action_values,
 )
 from gto_cfr import SimpleMCCFR
-from hand_strength import evaluate_hand
+from hand_strength import hand_category
+from sim import batch_equity_for, calculate_equity, preflop_equity, warmup
 import numpy as np
 
-_DEFAULT_SAVE_PATH = "gto_strategy.json"
+_DEFAULT_SAVE_PATH = "gto_strategy.npz"
+
+# 賭けに直面していない（call_amount == 0）局面での Monte Carlo 試行数の上限。
+# 誰もベットしていない局面は fold を考えなくてよく、プリフロップは粗いバケットで足りる
+_OPEN_SIMS: dict[str, int] = {'preflop': 50, 'flop': 200, 'turn': 400, 'river': 400}
 
 # ──────────────────────────────────────────────
 # GTO 的なベットサイジング
@@ -60,6 +64,28 @@ def _compute_raise_amount(cfr_action: str, pot: int, min_raise: int) -> int:
     return max(rounded, min_raise)
 
 
+def _sample_action(strategy: dict[str, float]) -> str:
+    """
+    strategy の確率に従ってアクションを 1 つ選ぶ。
+    random.choices と同じく random() を 1 回だけ引いて累積ウェイトと比較するので、
+    同じ乱数列からは同じアクションが選ばれる（キー・ウェイトのリスト生成と bisect を省く）。
+    ウェイト合計が 0 の場合は均等分配にフォールバックする。
+    """
+    total = 0.0
+    for w in strategy.values():
+        total += w
+    if total <= 0:
+        actions = list(strategy)
+        return actions[int(random.random() * len(actions))]
+    r = random.random() * total
+    acc = 0.0
+    for action, w in strategy.items():
+        acc += w
+        if r < acc:
+            return action
+    return action  # 丸め誤差で r == total になった場合は末尾（random.choices と同じ）
+
+
 # ──────────────────────────────────────────────
 # GTO CPU エージェント
 # ──────────────────────────────────────────────
@@ -69,7 +95,7 @@ class GtoCpu(CpuAgent):
     Regret Matching による混合戦略で動作する GTO CPU。
 
     初期状態: ヒューリスティック戦略（学習なしで即プレイ可能）
-    ゲーム後: on_round_end() を呼ぶことで CFR 学習・JSON 保存ができる。
+    ゲーム後: on_round_end() を呼ぶことで CFR 学習・npz 保存ができる。
               ※ game.py を変更したくない場合は呼ばなくてもよい（ヒューリスティックで動作）
     """
 
@@ -81,20 +107,32 @@ class GtoCpu(CpuAgent):
         num_simulations: int = 400,
         n_realtime: int = 20,
         load_path: str | None = None,
+        cfr: SimpleMCCFR | None = None,
     ) -> None:
+        """
+        cfr を渡すとそのテーブルを共有して使い、ファイルからの読み込みは行わない
+        （selfplay で複数の GtoCpu が 1 つのテーブルに学習を書き込む用）。
+        """
         super().__init__(name, chips)
         self._save_path = save_path
         self._num_simulations = num_simulations
         self._n_realtime = n_realtime
-        self.cfr = SimpleMCCFR()
         self._rng = np.random.default_rng()
+        # selfplay の最初のハンドでコンパイル待ちが発生しないよう先に JIT を済ませる
+        warmup()
 
-        effective_load = load_path if load_path is not None else save_path
-        if effective_load != os.devnull:
-            self.cfr.load(effective_load)
+        if cfr is not None:
+            self.cfr = cfr
+        else:
+            self.cfr = SimpleMCCFR()
+            effective_load = load_path if load_path is not None else save_path
+            if effective_load != os.devnull:
+                self.cfr.load(effective_load)
 
-        # CFR 学習用の行動履歴（ラウンドごとにリセット）
-        self._action_history: list[dict[str, Any]] = []
+        # CFR 学習用の行動履歴（ラウンドごとにリセット）。1 判断 = 1 タプル:
+        # (state_key, CFR アクション空間, 選んだアクション, equity, call_amount, pot, street, hand_potential)
+        # 判断ごとに dict を作らないよう、フィールド名ではなく位置で持つ
+        self._action_history: list[tuple[str, list[str], str, float, int, int, str, str]] = []
 
     def reset_for_new_round(self) -> None:
         super().reset_for_new_round()
@@ -113,29 +151,42 @@ class GtoCpu(CpuAgent):
         min_raise: int = game_state.get('min_raise', call_amount * 2)
         max_raise_to: int = game_state.get('max_raise_to', self.chips + self.current_bet)
 
-        num_opponents = len([
-            p for p in game_state['players']
-            if p['status'] in ('active', 'all-in') and p['name'] != self.name
-        ])
+        # チェックしかできない局面は選択の余地がないので、エクイティ計算も学習記録も省く
+        # （fold / check のみなら check が支配戦略）
+        if call_amount == 0 and 'raise' not in valid_actions:
+            return 'check', 0
+
+        num_opponents = count_opponents(game_state)
+        street = get_street(board)
 
         # ── エクイティ計算（高速評価器使用）──
-        equity = 0.5
-        if self.hand is not None:
-            equity = calculate_equity_fast(
+        equity = None
+        if self.hand is not None and street == 'preflop':
+            # プリフロップは 169 クラスの事前計算表を引く（表が無ければ None）
+            equity = preflop_equity(self.hand, max(num_opponents, 1))
+        rollouts = game_state.get('rollout_ctx')
+        if self.hand is not None and equity is None and rollouts is not None:
+            # LearningGame が用意した共有ロールアウトを使う（列数が足りなければ None）
+            equity = batch_equity_for(self.hand, board, max(num_opponents, 1), rollouts)
+        if self.hand is not None and equity is None:
+            num_sims = self._num_simulations
+            if call_amount == 0:
+                num_sims = min(num_sims, _OPEN_SIMS[street])
+            equity = calculate_equity(
                 self.hand, board, max(num_opponents, 1),
-                num_simulations=self._num_simulations,
+                num_simulations=num_sims,
                 rng=self._rng,
             )
+        if equity is None:
+            equity = 0.5
 
         eq_bucket = get_equity_bucket(equity)
         is_last_to_act: bool = (game_state.get('last_to_act_name', '') == self.name)
 
         # ── ハンド・ポテンシャル詳細分類 ──
         hand_potential = 'na'
-        street = get_street(board)
         if self.hand is not None:
-            ev = evaluate_hand(self.hand, board)
-            hand_potential = get_hand_potential(ev.hand_type, self.hand, board)
+            hand_potential = get_hand_potential(hand_category(self.hand, board), self.hand, board)
 
         state_key = build_state_key(
             equity, board, call_amount, pot, num_opponents,
@@ -191,10 +242,7 @@ class GtoCpu(CpuAgent):
 
         # ── 確率的にアクションを選択（GTOの核心）──
         # ウェイト合計が 0 の場合（理論上は起きないが念のため）は均等分配にフォールバック
-        weights = list(strategy.values())
-        if sum(weights) <= 0:
-            weights = [1.0] * len(weights)
-        cfr_action = random.choices(list(strategy.keys()), weights=weights)[0]
+        cfr_action = _sample_action(strategy)
 
         # ── game.py 用に逆変換・ベットサイズ計算 ──
         amount = 0
@@ -210,17 +258,9 @@ class GtoCpu(CpuAgent):
             game_action = cfr_action  # 'fold' or 'check'
 
         # 行動履歴を保存（CFR 更新用: cfr_action でサイズ別後悔を蓄積）
-        self._action_history.append({
-            'state_key': state_key,
-            'eq_bucket': eq_bucket,
-            'strategy': strategy,
-            'action': cfr_action,
-            'call_amount': call_amount,
-            'pot': pot,
-            'equity': equity,
-            'street': street,
-            'hand_potential': hand_potential,
-        })
+        self._action_history.append((
+            state_key, cfr_actions, cfr_action, equity, call_amount, pot, street, hand_potential,
+        ))
 
         return game_action, amount
 
@@ -242,28 +282,26 @@ class GtoCpu(CpuAgent):
         """
         現在局面に特化した高速ロールアウトで regret_sum / strategy_sum を補強する。
         """
+        # ヒューリスティックの引数はループ中で変わらないので、必要になったら 1 回だけ求める
+        fallback = None
         for _ in range(self._n_realtime):
             # 現在の後悔から現時点の戦略を計算（visit_count を触らない）
-            regrets = self.cfr.regret_sum.get(state_key, {})
-            positive = {a: max(regrets.get(a, 0.0), 0.0) for a in cfr_actions}
-            total_r = sum(positive.values())
-            if total_r > 0:
-                strategy = {a: positive[a] / total_r for a in cfr_actions}
-            else:
-                strategy = heuristic_strategy(
-                    eq_bucket, cfr_actions,
-                    call_amount=call_amount, pot=pot,
-                    street=street, hand_potential=hand_potential,
-                )
+            strategy = self.cfr.regret_matching(state_key, cfr_actions)
+            if strategy is None:
+                if fallback is None:
+                    fallback = heuristic_strategy(
+                        eq_bucket, cfr_actions,
+                        call_amount=call_amount, pot=pot,
+                        street=street, hand_potential=hand_potential,
+                    )
+                strategy = fallback
 
             # エクイティに基づく確率的ロールアウト
             won = random.random() < equity
             reward = 1.0 if won else -1.0
 
             # 戦略に従ってアクションをサンプリング
-            taken = random.choices(
-                list(strategy.keys()), weights=list(strategy.values())
-            )[0]
+            taken = _sample_action(strategy)
 
             action_values = compute_action_values(
                 reward, equity, taken, cfr_actions,
@@ -280,7 +318,7 @@ class GtoCpu(CpuAgent):
 
     def on_round_end(self, won: bool) -> None:
         """
-        ラウンド終了後に呼ぶと CFR 学習を行い戦略 JSON を更新する。
+        ラウンド終了後に呼ぶと CFR 学習を行い、変更された状態を戦略ファイルの差分ログに追記する。
         game.py を変更したくない場合は呼ばなくてよい（ヒューリスティックで動作）。
 
         game.py の showdown / end_round_early の直後に追加可能:
@@ -290,18 +328,10 @@ class GtoCpu(CpuAgent):
         """
         reward = 1.0 if won else -1.0
 
-        for record in self._action_history:
-            state_key = record['state_key']
-            strategy = record['strategy']
-            taken = record['action']
-            equity_rec: float = record.get('equity', 0.5)
-            call_amount_rec: int = record.get('call_amount', 0)
-            pot_rec: int = record.get('pot', 1)
-            street_rec: str = record.get('street', 'postflop')
-            hand_pot_rec: str = record.get('hand_potential', 'na')
-
+        for (state_key, actions, taken, equity_rec, call_amount_rec, pot_rec,
+             street_rec, hand_pot_rec) in self._action_history:
             action_values = compute_action_values(
-                reward, equity_rec, taken, list(strategy.keys()),
+                reward, equity_rec, taken, actions,
                 call_amount_rec, pot_rec,
                 street=street_rec, hand_potential=hand_pot_rec,
             )
@@ -309,4 +339,5 @@ class GtoCpu(CpuAgent):
             self.cfr.update_regret(state_key, taken, action_values)
 
         self._action_history.clear()
-        self.cfr.save(self._save_path)
+        # 毎ラウンドは変更された状態だけを追記（全体の書き出しは差分ログが育ったときのみ）
+        self.cfr.log_delta(self._save_path)
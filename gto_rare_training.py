@@ -20,20 +20,18 @@ gto_rare_training.py
 from __future__ import annotations
 
 import argparse
-import contextlib
-import io
 import os
-import random
 import time
 from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
+import numpy as np
 from tqdm import tqdm
 
-from card import Board, create_deck
+from card import Board, Deck, MASTER_DECK
 from gto_cpu import GtoCpu
 from gto_cfr import SimpleMCCFR
-from gto_cfr_utils import merge_cfr_data, load_base, save_merged, cfr_to_dict
+from gto_cfr_utils import available_cpus
 from gto_strategy import classify_board_texture
 from learning_game import LearningGame
 
@@ -60,15 +58,18 @@ class BiasedLearningGame(LearningGame):
         sb: int = 10,
         bb: int = 20,
         target_textures: frozenset[str] | None = None,
+        silent: bool = False,
+        seed: int | None = None,
     ) -> None:
-        super().__init__(players, start_chips=start_chips, sb=sb, bb=bb)
+        super().__init__(players, start_chips=start_chips, sb=sb, bb=bb, silent=silent, seed=seed)
         self._target_textures: frozenset[str] = target_textures or frozenset()
 
-    def _make_deck(self, contesting: list) -> list:
+    def _make_deck(self, contesting: list) -> Deck:
         """
         target_textures に合致するフロップが来るデッキを生成。
 
-        デッキは末尾からポップされるため、フロップカードの位置は:
+        シャッフル済みデッキを Deck(shuffled=True) で包んで末尾から引かせるため、
+        フロップカードの位置は:
             deck[-(num_contesting*2 + 3) : -(num_contesting*2)]
         最大 100 回試行し、合致しなければランダムデッキにフォールバック。
         """
@@ -77,16 +78,14 @@ class BiasedLearningGame(LearningGame):
 
         n = len(contesting) * 2  # ホールカード分のオフセット
         for _ in range(100):
-            deck = create_deck()
-            random.shuffle(deck)
+            deck = list(MASTER_DECK)
+            self._rng.shuffle(deck)
             # フロップカード候補（末尾から n+3 番目〜 n+1 番目）
             flop_slice = deck[-(n + 3) : (-n if n > 0 else len(deck))]
             if len(flop_slice) == 3:
-                tmp_board = Board()
-                tmp_board.set_flops(tuple(flop_slice))
-                texture = classify_board_texture(tmp_board)
+                texture = classify_board_texture(Board.from_cards(flop_slice))
                 if texture in self._target_textures:
-                    return deck
+                    return Deck(deck, shuffled=True)
 
         # フォールバック: ランダム
         return super()._make_deck(contesting)
@@ -96,14 +95,16 @@ class BiasedLearningGame(LearningGame):
 # ワーカー関数（トップレベル: Windows spawn で pickle 可能にするため）
 # ──────────────────────────────────────────────
 
-def _run_rare_chunk(args: tuple) -> dict:
+def _run_rare_chunk(args: tuple) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
     """
     サブプロセスで実行される学習チャンク。
     known_common_states に含まれない state_key（レア / 未学習）の
-    CFR データのみを返す。
+    CFR データのみを (state_key の列, regret_sum, strategy_sum, visit_count) で返す。
     """
     chunk_hands, num_players, start_chips, num_simulations, known_common_states, target_textures = args
 
+    # 全プレイヤーで 1 つのテーブルを共有する
+    cfr = SimpleMCCFR()
     players = [
         GtoCpu(
             f"GTO-{i}",
@@ -111,6 +112,7 @@ def _run_rare_chunk(args: tuple) -> dict:
             save_path=os.devnull,
             num_simulations=num_simulations,
             n_realtime=0,  # selfplay では無効化（速度優先）
+            cfr=cfr,
         )
         for i in range(num_players)
     ]
@@ -120,28 +122,19 @@ def _run_rare_chunk(args: tuple) -> dict:
         sb=10,
         bb=20,
         target_textures=target_textures,
+        silent=True,
     )
 
     for _ in range(chunk_hands):
-        active = [p for p in game.players if p.chips > 0]
-        if len(active) < 2:
-            for p in game.players:
-                p.chips = start_chips
-                p.status = "active"
-        with contextlib.redirect_stdout(io.StringIO()):
-            game.play_round()
-
-    # レア状態 / 未学習状態のみをマージ
-    filtered_results = []
-    for p in players:
-        d = cfr_to_dict(p.cfr)
-        filtered = {
-            "regret_sum":   {k: v for k, v in d["regret_sum"].items()   if k not in known_common_states},
-            "strategy_sum": {k: v for k, v in d["strategy_sum"].items() if k not in known_common_states},
-            "visit_count":  {k: v for k, v in d["visit_count"].items()  if k not in known_common_states},
-        }
-        filtered_results.append(filtered)
-    return merge_cfr_data(filtered_results)
+        if game.players_with_chips < 2:
+            game.reset_stacks(start_chips)
+        # silent=True の Game はログを組み立てない（stdout の差し替えは不要）
+        game.play_round()
+
+    # レア状態 / 未学習状態の行だけを配列で返す（dict of dict より pickle が軽い）
+    keys, regrets, strategy, visits = cfr.arrays()
+    keep = [i for i, k in enumerate(keys) if k not in known_common_states]
+    return [keys[i] for i in keep], regrets[keep], strategy[keep], visits[keep]
 
 
 # ──────────────────────────────────────────────
@@ -152,7 +145,7 @@ def _analyze_rare_states(
     save_path: str, threshold: int
 ) -> tuple[frozenset[str], frozenset[str], dict]:
     """
-    gto_strategy.json を読み込み、レア状態を分析する。
+    gto_strategy.npz を読み込み、レア状態を分析する。
 
     Returns:
         known_common_states: visit_count >= threshold の状態（CFR 更新スキップ対象）
@@ -166,7 +159,7 @@ def _analyze_rare_states(
     texture_counter: dict[str, int] = defaultdict(int)
     rare_count = 0
 
-    for state_key, count in base_cfr.visit_count.items():
+    for state_key, count in base_cfr.visit_counts().items():
         if count >= threshold:
             known_common.add(state_key)
         else:
@@ -217,8 +210,11 @@ def run_rare_training(
         f" → {save_path}"
     )
 
-    base_data = load_base(save_path)
-    all_results: list[dict] = [base_data]
+    # ワーカーの結果は届いた順に学習済みテーブルへ直接足し込む（結果を溜めてから一括マージしない）
+    # 後悔はワーカー側でも 0 以上に保たれているので、add_arrays の下限処理は値を変えない
+    table = SimpleMCCFR()
+    table.load(save_path)
+    rare_updated = 0
     chunk_args = (
         _BATCH_HANDS_PER_WORKER,
         num_players,
@@ -235,26 +231,33 @@ def run_rare_training(
         unit="hands",
         bar_format="{desc}: {n_fmt} hands [{elapsed}, {rate_fmt}]{postfix}",
     )
+    def _on_result(result) -> None:
+        nonlocal rare_updated, total_hands
+        table.add_arrays(*result)
+        rare_updated += len(result[0])
+        total_hands += _BATCH_HANDS_PER_WORKER
+        pbar.update(_BATCH_HANDS_PER_WORKER)
+        pbar.set_postfix(rare_updated=rare_updated)
+
     try:
-        while time.monotonic() < end_time:
-            if effective_workers == 1:
-                result = _run_rare_chunk(chunk_args)
-                all_results.append(result)
-                total_hands += _BATCH_HANDS_PER_WORKER
-                pbar.update(_BATCH_HANDS_PER_WORKER)
-            else:
-                batch = [chunk_args] * effective_workers
-                with ProcessPoolExecutor(max_workers=effective_workers) as executor:
-                    futures = [executor.submit(_run_rare_chunk, a) for a in batch]
-                    for future in as_completed(futures):
-                        all_results.append(future.result())
-                        total_hands += _BATCH_HANDS_PER_WORKER
-                        pbar.update(_BATCH_HANDS_PER_WORKER)
-            rare_updated = sum(len(r["visit_count"]) for r in all_results[1:])
-            pbar.set_postfix(rare_updated=rare_updated)
+        if effective_workers == 1:
+            while time.monotonic() < end_time:
+                _on_result(_run_rare_chunk(chunk_args))
+        else:
+            # プールは 1 つだけ立て、チャンクが終わるたびに次を投入する（スライディングウィンドウ）
+            with ProcessPoolExecutor(max_workers=effective_workers) as executor:
+                pending = {executor.submit(_run_rare_chunk, chunk_args)
+                           for _ in range(effective_workers)}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _on_result(future.result())
+                        if time.monotonic() < end_time:
+                            pending.add(executor.submit(_run_rare_chunk, chunk_args))
     finally:
         pbar.close()
-        num_states = save_merged(all_results, save_path)
+        table.save(save_path)
+        num_states = len(table)
         print(f"[完了] 学習完了: {total_hands} ハンド / {num_states} 状態 → {save_path}")
 
 
@@ -280,16 +283,16 @@ def main() -> None:
         help="テーブル人数 (2〜10)",
     )
     parser.add_argument(
-        "--save", type=str, default="gto_strategy.json", metavar="PATH",
-        help="戦略 JSON の保存先",
+        "--save", type=str, default="gto_strategy.npz", metavar="PATH",
+        help="戦略ファイル（npz）の保存先",
     )
     parser.add_argument(
         "--sims", type=int, default=200, metavar="N",
         help="エクイティ計算の Monte Carlo 試行数",
     )
     parser.add_argument(
-        "--workers", type=int, default=os.cpu_count() or 1, metavar="N",
-        help="並列ワーカー数（デフォルト: 論理 CPU 数）",
+        "--workers", type=int, default=available_cpus(), metavar="N",
+        help="並列ワーカー数（デフォルト: このプロセスが使える CPU 数）",
     )
     args = parser.parse_args()
 
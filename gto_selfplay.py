@@ -2,7 +2,8 @@
 gto_selfplay.py
 
 GtoCpu 同士の自動対戦による事前学習スクリプト。
-マルチプロセスで複数テーブルを並列実行し、結果をマージして保存する。
+マルチプロセスで複数テーブルを並列実行し、学習済みテーブルを共有メモリで配って
+各ワーカーの差分をメインプロセスのテーブルへ集約して保存する。
 正常終了後、自動的にレア状態の集中学習（gto_rare_training）も実行する。
 
 使用例:
@@ -11,25 +12,23 @@ GtoCpu 同士の自動対戦による事前学習スクリプト。
     uv run python gto_selfplay.py --hands 5000
     uv run python gto_selfplay.py --hands 10000 --players 6
     uv run python gto_selfplay.py --workers 1              # シングルプロセス
-    uv run python gto_selfplay.py --save custom.json --sims 200
+    uv run python gto_selfplay.py --save custom.npz --sims 200
     uv run python gto_selfplay.py --verbose                # ゲーム出力を表示
     uv run python gto_selfplay.py --no-rare                # レア学習をスキップ
 """
 from __future__ import annotations
 
 import argparse
-import contextlib
-import io
 import os
 import time
-from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 
+import numpy as np
 from tqdm import tqdm
 
 from gto_cpu import GtoCpu
 from gto_cfr import SimpleMCCFR
-from gto_cfr_utils import merge_cfr_data, apply_merged_data, load_base, save_merged, cfr_to_dict
+from gto_cfr_utils import attach_shared, available_cpus, publish_shared, release_shared
 from gto_rare_training import run_rare_training
 from learning_game import LearningGame
 
@@ -38,36 +37,137 @@ from learning_game import LearningGame
 # ワーカー関数（トップレベル必須: Windows の spawn で pickle 可能にするため）
 # ──────────────────────────────────────────────
 
-def _run_chunk(args: tuple) -> dict:
+_Arrays = tuple[list[str], np.ndarray, np.ndarray, np.ndarray]
+
+
+# ワーカープロセスごとに 1 組だけ作って使い回す (設定, 共有テーブル, ゲーム)
+_WORKER: tuple[tuple, SimpleMCCFR, LearningGame] | None = None
+
+
+def _init_worker(num_players: int, start_chips: int, num_simulations: int, verbose: bool) -> None:
     """
-    サブプロセスで実行される学習チャンク。
-    独立した GtoCpu × N でゲームを回し、学習済み CFR データを返す。
-    ディスクへの保存は行わない（os.devnull に捨てる）。
+    ProcessPoolExecutor の initializer。テーブル・GtoCpu・LearningGame をプロセスに 1 組だけ作る。
+    チャンクごとに作り直さないので、プールを使い続ける間は初期化コストが 1 回で済む。
     """
-    chunk_hands, num_players, start_chips, num_simulations = args
-
+    global _WORKER
+    # 全プレイヤーで 1 つのテーブルを共有する（対称的な自己対戦なので全員の経験を同じ表に積む）
+    cfr = SimpleMCCFR()
     players = [
         GtoCpu(
             f"GTO-{i}",
             chips=start_chips,
             save_path=os.devnull,       # ワーカー内では保存しない
             num_simulations=num_simulations,
+            cfr=cfr,
         )
         for i in range(num_players)
     ]
-    game = LearningGame(players, start_chips=start_chips, sb=10, bb=20)
+    game = LearningGame(players, start_chips=start_chips, sb=10, bb=20, silent=not verbose,
+                        rollout_sims=num_simulations)
+    _WORKER = ((num_players, start_chips, num_simulations, verbose), cfr, game)
+
+
+def _run_chunk(args: tuple) -> _Arrays:
+    """
+    サブプロセスで実行される学習チャンク。
+    共有メモリ上の学習済みテーブルをワーカーのテーブルに読み込み直し、
+    ゲームを回した後、初期値からの差分だけを配列で返す。
+    ディスクへの保存は行わない（os.devnull に捨てる）。
+    """
+    chunk_hands, num_players, start_chips, num_simulations, verbose, shared_meta = args
+    config = (num_players, start_chips, num_simulations, verbose)
+    if _WORKER is None or _WORKER[0] != config:
+        _init_worker(*config)
+    _, cfr, game = _WORKER
+
+    # 前のチャンクの行は捨て、今回のスナップショットを先頭行から並べ直す（delta_since の前提）
+    base = attach_shared(shared_meta)
+    cfr.clear()
+    cfr.load_arrays(*base)
 
     for _ in range(chunk_hands):
-        active = [p for p in game.players if p.chips > 0]
-        if len(active) < 2:
-            for p in game.players:
-                p.chips = start_chips
-                p.status = "active"
-        with contextlib.redirect_stdout(io.StringIO()):
-            game.play_round()
+        if game.players_with_chips < 2:
+            game.reset_stacks(start_chips)
+        # silent な Game はログ文字列自体を組み立てない（stdout の差し替えは不要）
+        game.play_round()
 
-    # 全プレイヤーの CFR データをマージして返す（対称的な自己対戦なので合算可能）
-    return merge_cfr_data([cfr_to_dict(p.cfr) for p in players])
+    return cfr.delta_since(len(base[0]), *base[1:])
+
+
+def _run_batch(table: SimpleMCCFR, chunk_hands: list[int], num_players: int,
+               start_chips: int, num_simulations: int, verbose: bool,
+               on_done=None) -> None:
+    """
+    table を共有メモリに公開し、chunk_hands の各要素を 1 ワーカーで実行して
+    返ってきた差分を table に足し込む。ワーカーが 1 つならプロセスを立てずに実行する。
+    on_done(hands) は各チャンクの完了ごとに呼ばれる。
+    """
+    blocks, meta = publish_shared(table)
+    try:
+        worker_args = [(c, num_players, start_chips, num_simulations, verbose, meta)
+                       for c in chunk_hands]
+        if len(worker_args) == 1:
+            table.add_arrays(*_run_chunk(worker_args[0]))
+            if on_done:
+                on_done(chunk_hands[0])
+            return
+        with ProcessPoolExecutor(
+            max_workers=len(worker_args),
+            initializer=_init_worker,
+            initargs=(num_players, start_chips, num_simulations, verbose),
+        ) as executor:
+            futures = {executor.submit(_run_chunk, a): a[0] for a in worker_args}
+            for future in as_completed(futures):
+                table.add_arrays(*future.result())
+                if on_done:
+                    on_done(futures[future])
+    finally:
+        release_shared(blocks)
+
+
+def _run_pool_until(table: SimpleMCCFR, end_time: float, chunk_hands: int, num_workers: int,
+                    num_players: int, start_chips: int, num_simulations: int, verbose: bool,
+                    on_done=None) -> None:
+    """
+    時間ベースモード用。プールを 1 つだけ立てたまま end_time までチャンクを流し続ける。
+    チャンクが 1 つ終わるたびに差分を table に足し込み、その時点の table を
+    共有メモリに公開し直して次のチャンクを投入する（スライディングウィンドウ）。
+    遅いワーカーを待って他のワーカーが遊ぶことがなく、プロセス起動も 1 回で済む。
+    """
+    pending: dict = {}
+
+    def _submit(executor: ProcessPoolExecutor) -> None:
+        blocks, meta = publish_shared(table)
+        try:
+            future = executor.submit(
+                _run_chunk,
+                (chunk_hands, num_players, start_chips, num_simulations, verbose, meta),
+            )
+        except BaseException:
+            release_shared(blocks)
+            raise
+        pending[future] = blocks
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(num_players, start_chips, num_simulations, verbose),
+        ) as executor:
+            for _ in range(num_workers):
+                _submit(executor)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    release_shared(pending.pop(future))
+                    table.add_arrays(*future.result())
+                    if on_done:
+                        on_done(chunk_hands)
+                    if time.monotonic() < end_time:
+                        _submit(executor)
+    finally:
+        for blocks in pending.values():
+            release_shared(blocks)
 
 # ──────────────────────────────────────────────
 # メイン学習ループ
@@ -99,9 +199,9 @@ def run_selfplay(
         f" → {save_path}"
     )
 
-    base_data = load_base(save_path)
-    all_results: list[dict] = [base_data]
-    chunk_args = (_BATCH_HANDS_PER_WORKER, num_players, start_chips, num_simulations)
+    # 学習済みテーブルはメインプロセスが 1 つだけ持ち、バッチごとに共有メモリで配る
+    table = SimpleMCCFR()
+    table.load(save_path)
 
     # ── 時間ベースモード ────────────────────────────
     if timed:
@@ -113,32 +213,25 @@ def run_selfplay(
             unit="hands",
             bar_format="{desc}: {n_fmt} hands [{elapsed} elapsed, {rate_fmt}]{postfix}",
         )
+
+        def _on_done(hands: int) -> None:
+            nonlocal total_hands
+            total_hands += hands
+            pbar.update(hands)
+            pbar.set_postfix(states=len(table))
+
         try:
-            while time.monotonic() < end_time:
-                remaining = end_time - time.monotonic()
-                if remaining <= 0:
-                    break
-
-                if effective_workers == 1:
-                    result = _run_chunk(chunk_args)
-                    all_results.append(result)
-                    total_hands += _BATCH_HANDS_PER_WORKER
-                    pbar.update(_BATCH_HANDS_PER_WORKER)
-                else:
-                    batch = [chunk_args] * effective_workers
-                    with ProcessPoolExecutor(max_workers=effective_workers) as executor:
-                        futures = [executor.submit(_run_chunk, a) for a in batch]
-                        for future in as_completed(futures):
-                            all_results.append(future.result())
-                            total_hands += _BATCH_HANDS_PER_WORKER
-                            pbar.update(_BATCH_HANDS_PER_WORKER)
-
-                num_states = sum(len(r["visit_count"]) for r in all_results)
-                pbar.set_postfix(states=num_states)
+            if effective_workers == 1:
+                while time.monotonic() < end_time:
+                    _run_batch(table, [_BATCH_HANDS_PER_WORKER],
+                               num_players, start_chips, num_simulations, verbose, _on_done)
+            else:
+                _run_pool_until(table, end_time, _BATCH_HANDS_PER_WORKER, effective_workers,
+                                num_players, start_chips, num_simulations, verbose, _on_done)
         finally:
             pbar.close()
-            num_states = save_merged(all_results, save_path)
-            print(f"[完了] {total_hands} ハンド / {num_states} 状態 → {save_path}")
+            table.save(save_path)
+            print(f"[完了] {total_hands} ハンド / {len(table)} 状態 → {save_path}")
         if run_rare:
             # selfplay 時間の 20%（最低 1 分）
             rare_secs = max(60.0, max_seconds * 0.2)
@@ -152,32 +245,27 @@ def run_selfplay(
         done = 0
         while done < num_hands:
             this_chunk = min(chunk_size, num_hands - done)
-            result = _run_chunk((this_chunk, num_players, start_chips, num_simulations))
-            all_results.append(result)
+            _run_batch(table, [this_chunk], num_players, start_chips, num_simulations, verbose)
             done += this_chunk
             pbar.update(this_chunk)
-            pbar.set_postfix(states=sum(len(r["visit_count"]) for r in all_results))
+            pbar.set_postfix(states=len(table))
         pbar.close()
 
     else:
         base_chunk = num_hands // effective_workers
         chunks = [base_chunk] * effective_workers
         chunks[-1] += num_hands - sum(chunks)
-        worker_args = [(c, num_players, start_chips, num_simulations) for c in chunks]
-
-        with ProcessPoolExecutor(max_workers=effective_workers) as executor:
-            futures = {executor.submit(_run_chunk, a): i for i, a in enumerate(worker_args)}
-            with tqdm(total=effective_workers, desc="Self-Play", unit="workers") as pbar:
-                for future in as_completed(futures):
-                    all_results.append(future.result())
-                    pbar.update(1)
-                    pbar.set_postfix(
-                        done=f"{len(all_results) - 1}/{effective_workers}",
-                        states=sum(len(r["visit_count"]) for r in all_results),
-                    )
-
-    num_states = save_merged(all_results, save_path)
-    print(f"[完了] {num_states} 状態 → {save_path}")
+
+        with tqdm(total=effective_workers, desc="Self-Play", unit="workers") as pbar:
+            def _on_done(hands: int) -> None:
+                pbar.update(1)
+                pbar.set_postfix(done=f"{pbar.n}/{effective_workers}", states=len(table))
+
+            _run_batch(table, chunks, num_players, start_chips, num_simulations, verbose,
+                       _on_done)
+
+    table.save(save_path)
+    print(f"[完了] {len(table)} 状態 → {save_path}")
 
     if run_rare:
         # ハンド数ベースの場合は固定 2 分
@@ -231,16 +319,16 @@ def main() -> None:
         help="テーブル人数 (2〜10)",
     )
     parser.add_argument(
-        "--save", type=str, default="gto_strategy.json", metavar="PATH",
-        help="戦略 JSON の保存先",
+        "--save", type=str, default="gto_strategy.npz", metavar="PATH",
+        help="戦略ファイル（npz）の保存先",
     )
     parser.add_argument(
         "--sims", type=int, default=200, metavar="N",
         help="エクイティ計算の Monte Carlo 試行数（少ないほど高速・精度低）",
     )
     parser.add_argument(
-        "--workers", type=int, default=os.cpu_count() or 1, metavar="N",
-        help="並列ワーカー数（デフォルト: 論理 CPU 数）",
+        "--workers", type=int, default=available_cpus(), metavar="N",
+        help="並列ワーカー数（デフォルト: このプロセスが使える CPU 数）",
     )
     parser.add_argument(
         "--verbose", action="store_true",
@@ -6,9 +6,14 @@ GTO 戦略のための状態抽象化・ヒューリスティック・アクシ
 """
 from __future__ import annotations
 from collections import Counter
+from functools import lru_cache
 from typing import Any
 from card import Board
-from hand_strength import evaluate_hand, EvaluatedHand
+
+try:
+    from preflop_gto import preflop_heuristic
+except ImportError:
+    preflop_heuristic = None  # preflop_gto が存在しない場合はポストフロップ戦略で代替
 
 # ──────────────────────────────────────────────
 # 状態の抽象化 (Bucketing)
@@ -22,26 +27,42 @@ def get_equity_bucket_5(equity: float) -> int:
     """エクイティを 0-4 の 5 段階に分類 (20% 刻み)。状態キー用（収束速度優先）。"""
     return min(int(equity * 5), 4)
 
+# ボード枚数 → ストリート名（1〜2枚は存在しないが、従来どおり river 扱い）
+_STREET_BY_COUNT = ('preflop', 'river', 'river', 'flop', 'turn', 'river')
+
+
 def get_street(board: Board) -> str:
-    n = len(board.get_all_cards())
-    if n == 0: return 'preflop'
-    if n == 3: return 'flop'
-    if n == 4: return 'turn'
-    return 'river'
+    return _STREET_BY_COUNT[board.mask.bit_count()]
 
 def classify_board_texture(board: Board) -> str:
-    """ボードのテクスチャを分類する。Counter を使用して O(n) で処理。"""
-    cards = board.get_all_cards()
-    if not cards:
-        return 'na'
-
-    suit_counts = Counter(c.suit for c in cards)
-    rank_counts = Counter(c.rank_int for c in cards)
-    max_suit = max(suit_counts.values())
-    max_rank = max(rank_counts.values())
+    """
+    ボードのテクスチャを分類する。
 
-    if max_rank >= 3: return 'trips'
-    if max_rank == 2: return 'paired'
+    board.mask（スートごとに 13bit のランクマスク）をビット演算で数えるので、
+    カードの列挙や Counter の生成は行わない。
+    ボードが変わるのは 1 ハンドで数回なので、結果は mask と一緒に board に覚えておく。
+    """
+    m = board.mask
+    if not m:
+        return 'na'
+    cache = board._texture_cache
+    if cache is not None and cache[0] == m:
+        return cache[1]
+    texture = _classify_mask(m)
+    board._texture_cache = (m, texture)
+    return texture
+
+
+def _classify_mask(m: int) -> str:
+    """classify_board_texture の本体（空でない board.mask を受け取る）"""
+    s0 = m & 0x1FFF
+    s1 = (m >> 13) & 0x1FFF
+    s2 = (m >> 26) & 0x1FFF
+    s3 = m >> 39
+    # 3スート以上 / 2スート以上に現れるランク = トリップス以上 / ペア以上
+    if (s0 & s1 & (s2 | s3)) | (s2 & s3 & (s0 | s1)): return 'trips'
+    if (s0 & (s1 | s2 | s3)) | (s1 & (s2 | s3)) | (s2 & s3): return 'paired'
+    max_suit = max(s0.bit_count(), s1.bit_count(), s2.bit_count(), s3.bit_count())
     if max_suit >= 3: return 'monotone'
     if max_suit == 2: return 'flush_draw'
     return 'rainbow'
@@ -63,7 +84,7 @@ def get_hand_potential(hand_type: str, hand: Any, board: Board) -> str:
         return 'mid'
 
     if hand_type == 'ONE_PAIR':
-        board_cards = board.get_all_cards()
+        board_cards = board.cards
         max_board_rank = max(c.rank_int for c in board_cards) if board_cards else 0
         all_ranks = [c.rank_int for c in list(hand.cards) + list(board_cards)]
         rank_counts = Counter(all_ranks)
@@ -131,8 +152,25 @@ def build_state_key(
 
     opp_count = 1 if num_opponents == 1 else 2
 
+    return _postflop_state_key(street, texture, pot_ratio, stack_depth, opp_count,
+                               int(is_last_to_act), eq5, hand_potential, did_invest, facing_reraise)
+
+
+@lru_cache(maxsize=None)
+def _postflop_state_key(
+    street: str, texture: str, pot_ratio: int, stack_depth: int, opp_count: int,
+    pos: int, eq5: int, hand_potential: str, did_invest: int, facing_reraise: int,
+) -> str:
+    """
+    ポストフロップの状態キー文字列を、離散化済みの小さな値の組から作る。
+
+    組み合わせは高々 12 万通り（実際に現れるのは数千）なので結果をキャッシュし、
+    同じ状態には同じ str オブジェクトを返す。
+    毎回の文字列生成が無くなり、str のハッシュもオブジェクトに保持されるので
+    SimpleMCCFR の状態 ID 辞書の引き直しも安くなる。
+    """
     return (f"{street}_{texture}_p{pot_ratio}_s{stack_depth}"
-            f"_o{opp_count}_pos{int(is_last_to_act)}_eq{eq5}_{hand_potential}"
+            f"_o{opp_count}_pos{pos}_eq{eq5}_{hand_potential}"
             f"_i{did_invest}_fr{facing_reraise}")
 
 
@@ -233,34 +271,49 @@ def heuristic_strategy(
     hand_potential: nuts / strong / mid / weak_made / draw / nothing / na
     """
     # プリフロップは 169ハンドテーブルに委譲
-    if state_key.startswith('preflop_') or street == 'preflop':
-        try:
-            from preflop_gto import preflop_heuristic
-            parts = state_key.split('_')
-            if len(parts) >= 4:
-                hand_key = parts[1]
-                position  = parts[2]
-                facing    = parts[3]
-                return preflop_heuristic(hand_key, position, facing, valid_actions,
-                                         call_amount=call_amount, pot=pot)
-        except ImportError:
-            pass  # preflop_gto が存在しない場合はポストフロップ戦略で代替
+    if preflop_heuristic is not None and (state_key.startswith('preflop_') or street == 'preflop'):
+        parts = state_key.split('_')
+        if len(parts) >= 4:
+            hand_key = parts[1]
+            position  = parts[2]
+            facing    = parts[3]
+            return preflop_heuristic(hand_key, position, facing, valid_actions,
+                                     call_amount=call_amount, pot=pot)
 
+    pot_odds = call_amount / (pot + call_amount) if (pot + call_amount) > 0 and call_amount > 0 else 0.0
+
+    # リレイズ対応: 状態キーから facing_reraise フラグを読み取る
+    facing_reraise = '_fr1' in state_key
+
+    # 以降は下の引数だけで決まるので、同じ組み合わせの再計算はキャッシュから返す
+    return dict(_postflop_strategy_items(
+        eq_bucket, tuple(valid_actions), max(num_players, 2),
+        facing_reraise, pot_odds, street, hand_potential,
+    ))
+
+
+@lru_cache(maxsize=8192)
+def _postflop_strategy_items(
+    eq_bucket: int,
+    valid_actions: tuple[str, ...],
+    num_players: int,
+    facing_reraise: bool,
+    pot_odds: float,
+    street: str,
+    hand_potential: str,
+) -> tuple[tuple[str, float], ...]:
+    """heuristic_strategy のポストフロップ部分（(行動, 確率) のタプルで返すメモ化対象）"""
     strategy = {a: 0.0 for a in valid_actions}
     equity = (eq_bucket + 0.5) / 20.0  # 5%刻みバケットの中央値
 
     # 人数スケーリング: 多人数ではエクイティ閾値を下げる
     # 2人戦の閾値をベースに、人数が増えるほど閾値が低くなる
-    scale = 2.0 / max(num_players, 2)
-    pot_odds = call_amount / (pot + call_amount) if (pot + call_amount) > 0 and call_amount > 0 else 0.0
-
-    # リレイズ対応: 状態キーから facing_reraise フラグを読み取る
-    facing_reraise = '_fr1' in state_key
+    scale = 2.0 / num_players
 
     # ── リレイズ時の特別処理 ──
     # 相手のリレイズレンジは強いハンドに絞られる → こちらは大きく絞る
     if facing_reraise:
-        return _reraise_strategy(strategy, equity, hand_potential, valid_actions, pot_odds)
+        return tuple(_reraise_strategy(strategy, equity, hand_potential, valid_actions, pot_odds).items())
 
     # ──────────────────────────
     # ストリート別ヒューリスティック
@@ -282,7 +335,7 @@ def heuristic_strategy(
         # ポストフロップ汎用（フォールバック）
         _generic_strategy(strategy, equity, valid_actions, scale)
 
-    return _normalize(strategy, valid_actions)
+    return tuple(_normalize(strategy, valid_actions).items())
 
 
 def _reraise_strategy(
@@ -1,65 +1,124 @@
-from collections import Counter
-from card import Card, Hand, Board
+from enum import IntEnum
+from functools import lru_cache
 
-HAND_RANK_MAP = {
-  'HIGH_CARD': 0, 'ONE_PAIR': 1, 'TWO_PAIR': 2, 'THREE_OF_A_KIND': 3,
-  'STRAIGHT': 4, 'FLUSH': 5, 'FULL_HOUSE': 6, 'FOUR_OF_A_KIND': 7,
-  'STRAIGHT_FLUSH': 8, 'ROYAL_FLUSH': 9
-}
+from card import CARD_BY_CODE, Card, Hand, Board
+from fast_eval import STRAIGHT_HIGH, eval7
+
+class HandType(IntEnum):
+  """役のカテゴリ（値は value // 15**6 と一致する）"""
+  HIGH_CARD = 0
+  ONE_PAIR = 1
+  TWO_PAIR = 2
+  THREE_OF_A_KIND = 3
+  STRAIGHT = 4
+  FLUSH = 5
+  FULL_HOUSE = 6
+  FOUR_OF_A_KIND = 7
+  STRAIGHT_FLUSH = 8
+  ROYAL_FLUSH = 9
+
+# 役名 → カテゴリ番号。値は素の int にしておく（Enum の属性参照や IntEnum の演算は dict 引き + int より遅い）
+HAND_RANK_MAP: dict[str, int] = {t.name: t.value for t in HandType}
+
+# カテゴリ番号（value // 15**6）→ 役名
+HAND_CATEGORIES: tuple[str, ...] = tuple(t.name for t in HandType)
+_B6 = 15 ** 6
+_B5, _B4, _B3, _B2 = 15 ** 5, 15 ** 4, 15 ** 3, 15 ** 2
 
 class EvaluatedHand:
-  def __init__(self, hand_type: str, primary_rank: int = 0, secondary_rank: int = 0, 
+  """評価済みの役\n
+  強さは整数 value（15進: 役, primary, secondary, kicker×4）1つで持ち、比較は value だけで行う。\n
+  value // 15**6 が役のカテゴリなので、hand_type / hand_type_rank は表示時に value から求める"""
+  __slots__ = ('value', 'primary_rank', 'secondary_rank', 'kicker_ranks', 'best_cards')
+
+  def __init__(self, hand_type: str | HandType, primary_rank: int = 0, secondary_rank: int = 0, 
                kicker_ranks: tuple = (), best_cards: list[Card] = None):
-    self.hand_type = hand_type
-    self.hand_type_rank = HAND_RANK_MAP[hand_type]
     self.primary_rank = primary_rank
     self.secondary_rank = secondary_rank
     self.kicker_ranks = kicker_ranks
     self.best_cards = best_cards if best_cards else []
-    self.value = self._calculate_value()
-
-  def _calculate_value(self):
-    value_components = [self.hand_type_rank, self.primary_rank, self.secondary_rank]
-    expected_kicker_slots = 4
-    for i in range(expected_kicker_slots):
-      value_components.append(self.kicker_ranks[i] if i < len(self.kicker_ranks) else 0)
-    final_value = 0
-    for i, comp in enumerate(reversed(value_components)):
-      final_value += comp * (15 ** i)
-    return final_value
+    # 15進数で1回だけ組み立てる（fast_eval のスコアと同一スケール）。キッカーは4つに0埋めして桁の重みを掛ける
+    # hand_type は役名でも HandType でもよい（不正な役名は KeyError）
+    cat = hand_type if isinstance(hand_type, HandType) else HandType[hand_type]
+    k0, k1, k2, k3 = (*kicker_ranks, 0, 0, 0, 0)[:4]
+    self.value = (int(cat) * _B6 + primary_rank * _B5 + secondary_rank * _B4
+                  + k0 * _B3 + k1 * _B2 + k2 * 15 + k3)
+
+  @property
+  def hand_type_rank(self) -> int:
+    return self.value // _B6
+
+  @property
+  def hand_type(self) -> str:
+    return HAND_CATEGORIES[self.value // _B6]
 
   def __lt__(self, other): return self.value < other.value
   def __eq__(self, other): return self.value == other.value
   def __gt__(self, other): return self.value > other.value
 
 def evaluate_hand(hand: Hand, board: Board) -> EvaluatedHand:
-  """ハンドとボードから役を評価する（高速なルールベース判定）"""
-  BOARD = (list(board.flops) if board.flops else []) + ([board.turn] if board.turn else []) + ([board.river] if board.river else [])
-  ALL_CARDS = list(hand.cards) + BOARD
-  
-  # ランクとスートのカウント
-  INT_COUNTER = Counter(card.rank_int for card in ALL_CARDS)
-  SUIT_COUNTER = Counter(card.suit for card in ALL_CARDS)
+  """ハンドとボードから役を評価する（高速なルールベース判定）\n
+  同じボード（board.mask が同一）での再評価は hand に保持したキャッシュを返し、\n
+  別の Hand でも同じカード列なら _evaluate_cards の LRU キャッシュから返す"""
+  if hand._eval_board_mask == board.mask:
+    return hand._eval_cache
+  ev = _evaluate_cards((*hand.cards, *board.cards), hand.mask | board.mask)
+  hand._eval_board_mask = board.mask
+  hand._eval_cache = ev
+  return ev
+
+def hand_value(hand: Hand, board: Board) -> int:
+  """evaluate_hand(hand, board).value と同じスコアを返す（best_cards は作らない）\n
+  ボードが3枚以上（計5〜7枚）なら card_int のテーブル引き（fast_eval.eval7）、
+  ボードが空ならホールカード2枚のペア / ハイカードを直接組み立てる"""
+  n = board.card_count
+  if n >= 3:
+    return eval7([*(c.int_id for c in hand.cards), *(c.int_id for c in board.iter_cards())])
+  if n == 0:
+    r1, r2 = hand.cards[0].rank_int, hand.cards[1].rank_int
+    if r1 == r2:
+      return HAND_RANK_MAP['ONE_PAIR'] * _B6 + r1 * _B5
+    hi, lo = (r1, r2) if r1 > r2 else (r2, r1)
+    return HAND_RANK_MAP['HIGH_CARD'] * _B6 + hi * _B5 + lo * _B3
+  return evaluate_hand(hand, board).value
+
+def hand_category(hand: Hand, board: Board) -> str:
+  """役名だけが必要なとき用（ベスト5枚を組み立てない）"""
+  return HAND_CATEGORIES[hand_value(hand, board) // _B6]
+
+# 同じカード列（手札→ボードの順）と、それに対する EvaluatedHand をプロセス内で使い回す。
+# EvaluatedHand は作ったあと書き換えないので、別の Hand から同じ結果を共有してよい
+@lru_cache(maxsize=4096)
+def _evaluate_cards(ALL_CARDS: tuple[Card, ...], mask: int) -> EvaluatedHand:
+  """カード列 ALL_CARDS（その 52bit マスクが mask）の役を評価する"""
+  # スートごとの 13bit ランクマスクは Hand / Board の 52bit マスク（ビット位置 suit*13 + rank-2）を
+  # 13bit ずつ切り出すだけで得られる（枚数は popcount、ストレートフラッシュは表引きで分かる）
+  s0, s1, s2, s3 = mask & 0x1FFF, (mask >> 13) & 0x1FFF, (mask >> 26) & 0x1FFF, mask >> 39
+  # 出現しているランク（降順）と、枚数ごとのランク（降順）を、立っているランクのビットだけ上から1パスで振り分ける
+  ranks_desc = []
+  by_count = ([], [], [], [], [])
+  rank_mask = s0 | s1 | s2 | s3
+  rest = rank_mask
+  while rest:
+      i = rest.bit_length() - 1
+      rest ^= 1 << i
+      n = (s0 >> i & 1) + (s1 >> i & 1) + (s2 >> i & 1) + (s3 >> i & 1)
+      ranks_desc.append(i + 2)
+      by_count[n].append(i + 2)
+  fours, threes, pairs = by_count[4], by_count[3], by_count[2]
   
   # 1. フラッシュ判定
-  flush_suit = None
-  for suit, count in SUIT_COUNTER.items():
-      if count >= 5:
+  flush_suit = -1
+  for suit, flush_mask in enumerate((s0, s1, s2, s3)):
+      if flush_mask.bit_count() >= 5:
           flush_suit = suit
           break
   
-  if flush_suit:
-      flush_cards = sorted([c for c in ALL_CARDS if c.suit == flush_suit], key=lambda x: x.rank_int, reverse=True)
-      # ストレートフラッシュ判定
-      unique_flush_ranks = sorted(list(set(c.rank_int for c in flush_cards)), reverse=True)
-      sf_high = None
-      if len(unique_flush_ranks) >= 5:
-          for i in range(len(unique_flush_ranks) - 4):
-              if unique_flush_ranks[i] - unique_flush_ranks[i+4] == 4:
-                  sf_high = unique_flush_ranks[i]
-                  break
-          if sf_high is None and set([14, 5, 4, 3, 2]).issubset(set(unique_flush_ranks)):
-              sf_high = 5
+  if flush_suit >= 0:
+      # フラッシュのスートのカードはマスクのビットから降順に引き直す（MASTER_DECK の共有 Card）
+      flush_cards = [CARD_BY_CODE[(i + 2) << 2 | flush_suit] for i in range(12, -1, -1) if flush_mask >> i & 1]
+      # ストレートフラッシュ判定（カウント時に作ったランクマスクの表引き）
+      sf_high = STRAIGHT_HIGH[flush_mask]
       
       if sf_high:
           best = [c for c in flush_cards if c.rank_int <= sf_high][:5]
@@ -72,35 +131,23 @@ def evaluate_hand(hand: Hand, board: Board) -> EvaluatedHand:
       return EvaluatedHand('FLUSH', flush_cards[0].rank_int, kicker_ranks=tuple(c.rank_int for c in flush_cards[1:5]), best_cards=flush_cards[:5])
 
   # 2. フォーカード
-  fours = [r for r, c in INT_COUNTER.items() if c == 4]
   if fours:
-      f_rank = max(fours)
-      kicker = max([r for r in INT_COUNTER.keys() if r != f_rank])
+      f_rank = fours[0]
+      kicker = next(r for r in ranks_desc if r != f_rank)
       best = [c for c in ALL_CARDS if c.rank_int == f_rank] + [next(c for c in ALL_CARDS if c.rank_int == kicker)]
       return EvaluatedHand('FOUR_OF_A_KIND', f_rank, kicker_ranks=(kicker,), best_cards=best)
 
   # 3. フルハウス
-  threes = sorted([r for r, c in INT_COUNTER.items() if c == 3], reverse=True)
-  pairs = sorted([r for r, c in INT_COUNTER.items() if c >= 2], reverse=True)
+  # ここから先はフォーカードなし。2組目のスリーカードはフルハウスのペアとして使う
   if len(threes) >= 2:
       best = [c for c in ALL_CARDS if c.rank_int == threes[0]][:3] + [c for c in ALL_CARDS if c.rank_int == threes[1]][:2]
       return EvaluatedHand('FULL_HOUSE', threes[0], threes[1], best_cards=best)
-  if len(threes) == 1:
-      p_candidates = [p for p in pairs if p != threes[0]]
-      if p_candidates:
-          best = [c for c in ALL_CARDS if c.rank_int == threes[0]] + [c for c in ALL_CARDS if c.rank_int == p_candidates[0]][:2]
-          return EvaluatedHand('FULL_HOUSE', threes[0], p_candidates[0], best_cards=best)
-
-  # 4. ストレート
-  unique_ranks = sorted(list(INT_COUNTER.keys()), reverse=True)
-  straight_high = None
-  if len(unique_ranks) >= 5:
-      for i in range(len(unique_ranks) - 4):
-          if unique_ranks[i] - unique_ranks[i+4] == 4:
-              straight_high = unique_ranks[i]
-              break
-      if straight_high is None and set([14, 5, 4, 3, 2]).issubset(set(unique_ranks)):
-          straight_high = 5
+  if threes and pairs:
+      best = [c for c in ALL_CARDS if c.rank_int == threes[0]] + [c for c in ALL_CARDS if c.rank_int == pairs[0]][:2]
+      return EvaluatedHand('FULL_HOUSE', threes[0], pairs[0], best_cards=best)
+
+  # 4. ストレート（スートマスクの OR がそのまま 13bit ランクマスクなので表引きだけ）
+  straight_high = STRAIGHT_HIGH[rank_mask]
   
   if straight_high:
       if straight_high == 5:
@@ -113,25 +160,25 @@ def evaluate_hand(hand: Hand, board: Board) -> EvaluatedHand:
   # 5. スリーカード
   if threes:
       t_rank = threes[0]
-      kickers = sorted([r for r in INT_COUNTER.keys() if r != t_rank], reverse=True)[:2]
+      kickers = [r for r in ranks_desc if r != t_rank][:2]
       best = [c for c in ALL_CARDS if c.rank_int == t_rank] + [next(c for c in ALL_CARDS if c.rank_int == k) for k in kickers]
       return EvaluatedHand('THREE_OF_A_KIND', t_rank, kicker_ranks=tuple(kickers), best_cards=best)
 
   # 6. ツーペア
   if len(pairs) >= 2:
       p1, p2 = pairs[0], pairs[1]
-      kicker = max([r for r in INT_COUNTER.keys() if r != p1 and r != p2])
+      kicker = next(r for r in ranks_desc if r != p1 and r != p2)
       best = [c for c in ALL_CARDS if c.rank_int == p1][:2] + [c for c in ALL_CARDS if c.rank_int == p2][:2] + [next(c for c in ALL_CARDS if c.rank_int == kicker)]
       return EvaluatedHand('TWO_PAIR', p1, p2, kicker_ranks=(kicker,), best_cards=best)
 
   # 7. ワンペア
   if pairs:
       p_rank = pairs[0]
-      kickers = sorted([r for r in INT_COUNTER.keys() if r != p_rank], reverse=True)[:3]
+      kickers = [r for r in ranks_desc if r != p_rank][:3]
       best = [c for c in ALL_CARDS if c.rank_int == p_rank] + [next(c for c in ALL_CARDS if c.rank_int == k) for k in kickers]
       return EvaluatedHand('ONE_PAIR', p_rank, kicker_ranks=tuple(kickers), best_cards=best)
 
   # 8. ハイカード
-  sorted_ranks = sorted(list(INT_COUNTER.keys()), reverse=True)[:5]
+  sorted_ranks = ranks_desc[:5]
   best = [next(c for c in ALL_CARDS if c.rank_int == r) for r in sorted_ranks]
   return EvaluatedHand('HIGH_CARD', sorted_ranks[0], kicker_ranks=tuple(sorted_ranks[1:]), best_cards=best)
@@ -7,10 +7,16 @@ on_round_end(won) メソッドを持つ全プレイヤーに自動通知する
 ・GtoCpu に限らず、on_round_end を実装した任意のプレイヤーが学習できる
 ・game.py / player.py への変更は不要
 ・main.py では `Game` の代わりにこちらを使う
+・rollout_sims > 0 のとき、ストリートごとに共有ロールアウト行列を作って
+  game_state['rollout_ctx'] に載せる（GtoCpu がエクイティ計算に再利用する）
 """
 from __future__ import annotations
 
+import numpy as np
+
 from game import Game
+from player import Status
+from sim import _NUMBA_AVAILABLE, _PREFLOP_EQUITY_AVAILABLE, remaining_cards
 
 
 class LearningGame(Game):
@@ -21,16 +27,56 @@ class LearningGame(Game):
     on_round_end(won: bool) メソッドを持つプレイヤーに結果を通知する。
     """
 
+    def __init__(self, *args, rollout_sims: int = 0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # numba がない環境では行列を作っても速くならないので無効にする
+        self._rollout_sims = rollout_sims if _NUMBA_AVAILABLE else 0
+        self._np_rng = np.random.default_rng(self._rng.getrandbits(63))
+        # プレイヤーごとの on_round_end の有無（メンバーは変わらないので毎ラウンド hasattr を引かない）
+        self._has_round_end = [hasattr(p, 'on_round_end') for p in self.players]
+        # チップが残っているプレイヤー数（play_round での飛びと reset_stacks で更新する）
+        self.players_with_chips = sum(1 for p in self.players if p.chips > 0)
+
+    def reset_stacks(self, chips: int) -> None:
+        """全員のチップを chips に戻してゲームに復帰させる"""
+        for p in self.players:
+            p.chips = chips
+            p.status = Status.ACTIVE
+        self.players_with_chips = len(self.players)
+
+    def prepare_street_rollouts(self, n_sims: int) -> np.ndarray:
+        """
+        現ストリートの共有ロールアウト行列 (n_sims, K) を返す。
+
+        各行はボード以外の残りカードを一様ランダムに並べた先頭 K 枚。
+        K = 残りボード枚数 + 2 × (ストリート開始時の相手数の最大) + 2（hero の2枚を読み飛ばす分）。
+        全プレイヤーが同じ行列を使うため、乱数生成は1ストリート1回で済む。
+        """
+        remaining = remaining_cards(self.board.mask)
+        n_contesting = sum(1 for p in self.players if p.status <= Status.ALLIN)
+        k = min(5 - self.board.card_count + 2 * max(n_contesting - 1, 1) + 2, len(remaining))
+        vals = self._np_rng.random((n_sims, len(remaining)))
+        # 値の小さい K 個を選び、その中も値の順に並べる（＝一様な順列の先頭 K 枚）
+        idx = np.argpartition(vals, k - 1, axis=1)[:, :k]
+        idx = np.take_along_axis(idx, np.take_along_axis(vals, idx, axis=1).argsort(axis=1), axis=1)
+        return remaining[idx]
+
+    def _prepare_game_state(self, game_state: dict) -> None:
+        # プリフロップは GtoCpu が事前計算表を引くので、表があれば行列を作らない
+        if self._rollout_sims > 0 and (self.board.card_count > 0 or not _PREFLOP_EQUITY_AVAILABLE):
+            game_state['rollout_ctx'] = self.prepare_street_rollouts(self._rollout_sims)
+
     def play_round(self) -> bool:
-        # ラウンド前のチップを記録
-        chips_before = {p: p.chips for p in self.players}
+        # ラウンド前のチップを記録（players と同じ並びのリスト）
+        chips_before = [p.chips for p in self.players]
 
         result = super().play_round()
 
-        # チップが増えたプレイヤーを「勝者」とみなして通知
-        for p in self.players:
-            if hasattr(p, 'on_round_end'):
-                won = p.chips > chips_before[p]
-                p.on_round_end(won)
+        # チップが増えたプレイヤーを「勝者」とみなして通知し、このラウンドで飛んだ人数を引く
+        for p, before, notify in zip(self.players, chips_before, self._has_round_end):
+            if notify:
+                p.on_round_end(p.chips > before)
+            if before > 0 and p.chips == 0:
+                self.players_with_chips -= 1
 
         return result
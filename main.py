@@ -179,7 +179,7 @@ def main():
         run_selfplay(
             num_hands=None,
             num_players=min(args.players, 6),
-            save_path="gto_strategy.json",
+            save_path="gto_strategy.npz",
             num_simulations=args.sims,
             num_workers=args.workers,
             verbose=False,
@@ -1,37 +1,73 @@
+import random
+from enum import IntEnum
 from typing import Any
 from colorama import Fore, Style
-from card import Hand, Board, Card
-from probability import calculate_equity, calculate_hand_distribution
-from fast_eval import calculate_equity_fast
+from card import Hand, Board, Card, MASTER_DECK
+from probability import calculate_equity_cached, calculate_hand_distribution
+from sim import calculate_equity, preflop_equity
 import numpy as np
 
+# パック済み整数 → 色付き表示文字列（colored_str を毎回組み立てないための事前計算）
+_COLORED_FOR_CODE: dict[int, str] = {c.code: c.colored_str() for c in MASTER_DECK}
+
+class Status(IntEnum):
+    """プレイヤーの状態。ACTIVE/ALLIN を先頭に並べ、「ハンドに残っている」判定を `status <= Status.ALLIN` の整数比較1回で済ませる。"""
+    ACTIVE = 0
+    ALLIN = 1
+    FOLDED = 2
+    BUSTED = 3
+
+# 有効アクションのビットマスク（game_state['valid_actions'] に入る）
+FOLD = 1
+CHECK = 2
+CALL = 4
+RAISE = 8
+# ビットマスク → アクション名のタプル（valid_actions を名前で受け取るプレイヤー向け、毎ターンの list 生成を避ける）
+ACTIONS_FOR_MASK: tuple[tuple[str, ...], ...] = tuple(
+    tuple(name for bit, name in ((FOLD, 'fold'), (CHECK, 'check'), (CALL, 'call'), (RAISE, 'raise')) if m & bit)
+    for m in range(16)
+)
+
+def count_opponents(game_state: dict[str, Any]) -> int:
+    """手番のプレイヤーから見た、ハンドに残っている相手の人数。
+    Game が毎手番入れる game_state['num_contesting'] を使い、無ければ players を数える。"""
+    n = game_state.get('num_contesting')
+    if n is None:
+        n = sum(p['status'] <= Status.ALLIN for p in game_state['players'])
+    return n - 1
+
 class Player:
     def __init__(self, name: str, chips: int):
         self.name = name
         self.chips = chips
         self.hand: Hand | None = None
         self.current_bet: int = 0
-        self.status: str = 'active'
+        self.status: Status = Status.ACTIVE
 
     @staticmethod
     def hand_output_format(cards: list[Card] | tuple[Card, ...] | set[Card]) -> str:
         """スートに色を付けた形式でカードを表示する"""
-        return " ".join([c.colored_str() for c in cards])
+        table = _COLORED_FOR_CODE
+        # ハンド（2枚）は join を使わずに直接組み立てる
+        if len(cards) == 2:
+            a, b = cards
+            return f"{table[a.code]} {table[b.code]}"
+        return " ".join([table[c.code] for c in cards])
     
     def reset_for_new_round(self):
         self.hand = None
         self.current_bet = 0
-        if self.chips > 0: self.status = 'active'
-        else: self.status = 'busted'
+        if self.chips > 0: self.status = Status.ACTIVE
+        else: self.status = Status.BUSTED
 
     def pay(self, amount: int) -> int:
         actual_pay = min(amount, self.chips)
         self.chips -= actual_pay
         self.current_bet += actual_pay
-        if self.chips == 0: self.status = 'all-in'
+        if self.chips == 0: self.status = Status.ALLIN
         return actual_pay
 
-    def fold(self): self.status = 'folded'
+    def fold(self): self.status = Status.FOLDED
     def receive_winnings(self, amount: int): self.chips += amount
 
 class HumanPlayer(Player):
@@ -40,7 +76,7 @@ class HumanPlayer(Player):
         min_raise = game_state.get('min_raise', call_amount * 2)
         board = game_state['board']
         pot = game_state['pot']
-        num_opponents = len([p for p in game_state['players'] if p['status'] in ('active', 'all-in')]) - 1
+        num_opponents = count_opponents(game_state)
         
         print(f"\n--- {Fore.CYAN}{self.name}{Style.RESET_ALL} のターン (ポット: {Fore.GREEN}{pot}{Style.RESET_ALL}) ---")
         if self.hand and board:
@@ -48,15 +84,11 @@ class HumanPlayer(Player):
             sorted_dist = sorted(dist.items(), key=lambda x: x[1], reverse=True)
             dist_str = " | ".join([f"{k}: {v:.1%}" for k, v in sorted_dist[:4]])
             print(f"【完成確率】{dist_str}")
-            equity = calculate_equity(self.hand, board, num_opponents, num_simulations=500)
+            equity = calculate_equity_cached(self.hand, board, num_opponents, num_simulations=500)
             print(f"【推定勝率】{Fore.YELLOW}{equity:.1%}{Style.RESET_ALL} (vs {num_opponents}人)")
 
-        hand_cards = sorted(list(self.hand.cards), reverse=True) if self.hand else []
-        board_cards = []
-        if board:
-            if board.flops: board_cards.extend(board.flops)
-            if board.turn: board_cards.append(board.turn)
-            if board.river: board_cards.append(board.river)
+        hand_cards = self.hand.sorted_cards if self.hand else ()
+        board_cards = board.cards if board else ()
         
         print(f"手札: [{self.hand_output_format(hand_cards)}] | ボード: [{self.hand_output_format(board_cards)}]")
             
@@ -106,11 +138,13 @@ class CpuAgent(Player):
         call_amount = game_state['call_amount']
         pot = game_state['pot']
         board = game_state['board']
-        num_opponents = len([p for p in game_state['players'] if p['status'] in ('active', 'all-in')]) - 1
+        num_opponents = count_opponents(game_state)
         equity = 0.5
         if self.hand and board:
-            equity = calculate_equity_fast(self.hand, board, num_opponents,
-                                           num_simulations=400, rng=self._rng)
+            # プリフロップはエクイティ表を引き、表が無いときだけモンテカルロ
+            pre = preflop_equity(self.hand, num_opponents) if board.card_count == 0 else None
+            equity = pre if pre is not None else calculate_equity(
+                self.hand, board, num_opponents, num_simulations=400, rng=self._rng)
         if pot > 0 and call_amount > 0:
             bet_ratio = call_amount / pot
             if bet_ratio > 0.5: equity *= (1.0 - (min(bet_ratio, 1.5) * 0.2))
@@ -147,7 +181,6 @@ class BalancedCpu(CpuAgent):
 
 class AggressiveCpu(CpuAgent):
     def _smart_action(self, equity: float, pot_odds: float, valid_actions: list[str], game_state: dict) -> tuple[str, int]:
-        import random
         call_amount = game_state['call_amount']
         if (equity > 0.55 or random.random() < 0.15) and 'raise' in valid_actions:
             size = self._get_dynamic_raise_size(game_state['pot'], game_state['min_raise'], equity, 1.2)
@@ -1,9 +1,13 @@
+import argparse
 import json
 import time
 import os
+import numpy as np
 from tqdm import tqdm
 from card import Card, Hand, Board
-from probability import calculate_hand_distribution
+from hand_strength import HAND_CATEGORIES
+from probability import PREFLOP_DISTRIBUTIONS_PATH, calculate_hand_distribution
+from sim import _NUMBA_AVAILABLE, preflop_category_counts
 
 def get_all_preflop_combinations():
     """全169パターンのスターティングハンドの組み合わせを生成する"""
@@ -25,7 +29,7 @@ def get_all_preflop_combinations():
 
 def precompute():
     # 既存のデータをロード（途中から再開可能にするため）
-    json_path = "preflop_distributions.json"
+    json_path = PREFLOP_DISTRIBUTIONS_PATH
     results = {}
     if os.path.exists(json_path):
         try:
@@ -35,7 +39,23 @@ def precompute():
             pass
 
     all_combos = get_all_preflop_combinations()
-    
+
+    if _NUMBA_AVAILABLE:
+        # 169 パターンをまとめて、C(52,5) のボード列挙 1 回で数える
+        print(f"全{len(all_combos)}パターンのプリフロップ事前計算を開始します（ボード一括列挙）...")
+        hands = np.array(
+            [[(r1 - 2) * 4, (r2 - 2) * 4 + (0 if suited else 1)] for r1, r2, suited, _ in all_combos],
+            dtype=np.int64,
+        )
+        counts = preflop_category_counts(hands).tolist()
+        for (r1, r2, suited, _), row in zip(all_combos, counts):
+            total = sum(row)
+            results[f"{r1},{r2},{suited}"] = {HAND_CATEGORIES[i]: n / total for i, n in enumerate(row) if n}
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n完了！ {len(results)}パターンのデータを '{json_path}' に保存しました。")
+        return
+
     # すでに計算済みのものを除外（必要なら）
     # todo = [c for c in all_combos if f"{c[0]},{c[1]},{c[2]}" not in results]
     todo = all_combos # 今回は一から全て計算し直す想定
@@ -72,5 +92,47 @@ def precompute():
         
     print(f"\n完了！ {len(results)}パターンのデータを '{json_path}' に保存しました。")
 
+# エクイティ表の対戦人数の上限（テーブルは最大 10 人）
+MAX_OPPONENTS = 9
+
+def precompute_equity(num_simulations: int = 200_000):
+    """
+    169 クラス × 対戦人数 1..MAX_OPPONENTS のエクイティ（ランダムハンド相手・引き分けは等分）を
+    sim.mc_equity で求め、float32[169, MAX_OPPONENTS] として sim.PREFLOP_EQUITY_PATH に保存する。
+    GtoCpu はプリフロップでこの表を引き、モンテカルロを省略する。
+    """
+    from sim import PREFLOP_EQUITY_PATH, mc_equity, preflop_class
+
+    table = np.zeros((169, MAX_OPPONENTS), dtype=np.float32)
+    empty_board = np.empty(0, dtype=np.int64)
+    all_combos = get_all_preflop_combinations()
+    print(f"全{len(all_combos)}パターン × {MAX_OPPONENTS}人分のプリフロップ・エクイティを計算します...")
+
+    pbar = tqdm(all_combos, desc="Calculating Equity", unit="hand")
+    for r1, r2, suited, name in pbar:
+        pbar.set_postfix(hand=name)
+        # card_int = (rank-2)*4 + suit。スーテッドは同じスート、それ以外は別スート
+        hero = np.array([(r1 - 2) * 4, (r2 - 2) * 4 + (0 if suited else 1)], dtype=np.int64)
+        remaining = np.array([c for c in range(52) if c not in hero], dtype=np.int64)
+        cls = preflop_class(r1, r2, suited)
+        for n_opp in range(1, MAX_OPPONENTS + 1):
+            table[cls, n_opp - 1] = mc_equity(remaining, hero, empty_board, n_opp, num_simulations, cls)
+
+    np.save(PREFLOP_EQUITY_PATH, table)
+    print(f"\n完了！ プリフロップ・エクイティ表を '{PREFLOP_EQUITY_PATH}' に保存しました。")
+
 if __name__ == "__main__":
-    precompute()
+    parser = argparse.ArgumentParser(description="プリフロップの事前計算")
+    parser.add_argument(
+        "--equity", action="store_true",
+        help="役分布の代わりにエクイティ表（preflop_equity.npy）を生成する",
+    )
+    parser.add_argument(
+        "--sims", type=int, default=200_000, metavar="N",
+        help="エクイティ表の 1 マスあたりの Monte Carlo 試行数",
+    )
+    args = parser.parse_args()
+    if args.equity:
+        precompute_equity(args.sims)
+    else:
+        precompute()
@@ -1,54 +1,49 @@
-import random
+import atexit
 import json
+import math
 import os
 import time
-from typing import List, Optional, Dict
-from itertools import combinations
-from collections import Counter
-from concurrent.futures import ProcessPoolExecutor
-
-from card import Card, Hand, Board, create_deck
-from hand_strength import evaluate_hand
-
-# 1つ1つの組み合わせを評価するワーカー関数（並列実行用）
-def _evaluate_combination_batch(my_hand: Hand, combinations_chunk: List[tuple], 
-                                current_flops: Optional[tuple], 
-                                current_turn: Optional[Card], 
-                                current_river: Optional[Card]) -> Counter:
-    stats = Counter()
-    sim_board = Board()
-    
-    # 固定されているボードカードをセット
-    sim_board.flops = current_flops
-    sim_board.turn = current_turn
-    sim_board.river = current_river
-
-    for extra_cards in combinations_chunk:
-        # 足りないカードを埋める
-        # 順番に flops -> turn -> river の空いているところに割り当てる
-        ptr = 0
-        if sim_board.flops is None:
-            sim_board.flops = (extra_cards[ptr], extra_cards[ptr+1], extra_cards[ptr+2])
-            ptr += 3
-        if sim_board.turn is None:
-            sim_board.turn = extra_cards[ptr]
-            ptr += 1
-        if sim_board.river is None:
-            sim_board.river = extra_cards[ptr]
-            ptr += 1
-        
-        res = evaluate_hand(my_hand, sim_board)
-        stats[res.hand_type] += 1
-        
-        # 次のループのために、新しく埋めた箇所だけリセット
-        if current_flops is None: sim_board.flops = None
-        if current_turn is None: sim_board.turn = None
-        if current_river is None: sim_board.river = None
-        
-    return stats
+from typing import Iterator, List, Optional, Dict
+from itertools import chain, combinations, islice
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from card import Card, Hand, Board
+from hand_strength import HAND_CATEGORIES, _B6, hand_category
+from fast_eval import eval7
+from sim import (
+    N_CATEGORIES, _NUMBA_AVAILABLE, category_counts, preflop_equity, remaining_cards,
+    calculate_equity as _sim_equity,
+)
+
+# 組み合わせをまとめて評価するワーカー関数（並列実行用）
+# 固定カード（手札＋現在のボード）と、足りない分のカードを card_int の uint8 配列 [組み合わせ数, k] で受け取り、
+# 役カテゴリごとの出現数を返す（Card オブジェクトのタプルを pickle して渡すより転送量がずっと小さい）
+def _evaluate_combination_batch(fixed: List[int], combo_ids: np.ndarray) -> np.ndarray:
+    # カテゴリだけ分かればよいので EvaluatedHand もベスト5枚も作らない。埋める順序は評価に影響しない
+    counts = [0] * N_CATEGORIES
+    for extra in combo_ids.tolist():
+        counts[eval7(fixed + extra) // _B6] += 1
+    return np.array(counts, dtype=np.int64)
+
+# 組み合わせ評価用のプロセスプール。呼び出しごとに立ち上げ直さず、最初に必要になったときに作って使い回す
+_POOL: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        atexit.register(_POOL.shutdown)
+    return _POOL
 
 def calculate_hand_distribution(my_hand: Hand, board: Board, parallel: bool = True) -> Dict[str, float]:
-    current_board_cards = list(board.get_all_cards())
+    current_board_cards = board.cards
     needed_count = 5 - len(current_board_cards)
     
     # プリフロップかつJSONが存在する場合
@@ -58,77 +53,130 @@ def calculate_hand_distribution(my_hand: Hand, board: Board, parallel: bool = Tr
             return precomputed
 
     if needed_count <= 0:
-        final_hand = evaluate_hand(my_hand, board)
-        return {final_hand.hand_type: 1.0}
+        return {hand_category(my_hand, board): 1.0}
+
+    if _NUMBA_AVAILABLE:
+        # 列挙と評価を JIT カーネルで一度に行う（組み合わせのリストもプロセスプールも使わない）
+        fixed = np.array([c.int_id for c in (*my_hand.cards, *current_board_cards)], dtype=np.int64)
+        remaining = remaining_cards(my_hand.mask | board.mask)
+        counts = category_counts(fixed, remaining, needed_count).tolist()
+        total = sum(counts)
+        return {HAND_CATEGORIES[i]: n / total for i, n in enumerate(counts) if n}
+
+    fixed = [c.int_id for c in (*my_hand.cards, *current_board_cards)]
+    remaining = remaining_cards(my_hand.mask | board.mask).tolist()
+    total_combinations = math.comb(len(remaining), needed_count)
+    counts = np.zeros(N_CATEGORIES, dtype=np.int64)
 
-    full_deck = create_deck()
-    known_cards = list(my_hand.cards) + current_board_cards
-    remaining_deck = [c for c in full_deck if c not in known_cards]
-    
-    all_combos = list(combinations(remaining_deck, needed_count))
-    total_combinations = len(all_combos)
-    
-    # 現在のボード状態を保存
-    c_flops, c_turn, c_river = board.flops, board.turn, board.river
-    
     if parallel and total_combinations > 10000:
         num_workers = os.cpu_count() or 1
         chunk_size = total_combinations // (num_workers * 4) + 1
-        chunks = [all_combos[i:i + chunk_size] for i in range(0, total_combinations, chunk_size)]
-        
-        combined_stats = Counter()
-        with ProcessPoolExecutor() as executor:
-            futures = [executor.submit(_evaluate_combination_batch, my_hand, chunk, c_flops, c_turn, c_river) for chunk in chunks]
-            for f in futures:
-                combined_stats.update(f.result())
+        # 組み合わせはリストに溜めずに少しずつ切り出し、処理中のチャンクはワーカー数の2倍までに抑える
+        chunks = _combo_chunks(remaining, needed_count, chunk_size)
+        pool = _get_pool()
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_evaluate_combination_batch, fixed, chunk))
+            if len(pending) >= num_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    counts += f.result()
+        for f in pending:
+            counts += f.result()
     else:
-        combined_stats = _evaluate_combination_batch(my_hand, all_combos, c_flops, c_turn, c_river)
-        
-    return {hand_type: count / total_combinations for hand_type, count in combined_stats.items()}
+        for chunk in _combo_chunks(remaining, needed_count, 10000):
+            counts += _evaluate_combination_batch(fixed, chunk)
+
+    return {HAND_CATEGORIES[i]: n / total_combinations for i, n in enumerate(counts.tolist()) if n}
+
+def _combo_chunks(remaining: List[int], k: int, chunk_size: int) -> Iterator[np.ndarray]:
+    """remaining から k 枚選ぶ組み合わせを、最大 chunk_size 行ずつの uint8 配列 [行数, k] として順に返す"""
+    combo_iter = combinations(remaining, k)
+    while True:
+        chunk = np.fromiter(chain.from_iterable(islice(combo_iter, chunk_size)), dtype=np.uint8)
+        if not len(chunk):
+            return
+        yield chunk.reshape(-1, k)
 
 def _get_preflop_key(my_hand: Hand) -> str:
     c1, c2 = sorted(my_hand.cards, key=lambda x: x.rank_int, reverse=True)
     is_suited = c1.suit == c2.suit
     return f"{c1.rank_int},{c2.rank_int},{is_suited}"
 
-def _load_precomputed_preflop(my_hand: Hand) -> Optional[Dict[str, float]]:
-    json_path = "preflop_distributions.json"
-    if not os.path.exists(json_path): return None
+# precompute_preflop.py が書き出す役分布表（カレントディレクトリではなくモジュールの隣に置く）
+PREFLOP_DISTRIBUTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_distributions.json")
+
+# パース済みの役分布表と、そのときのファイルの更新時刻
+_PREFLOP_CACHE: Optional[Dict[str, Dict[str, float]]] = None
+_PREFLOP_MTIME: float = 0.0
+
+def _preflop_table() -> Optional[Dict[str, Dict[str, float]]]:
+    # ファイルが更新されたときだけパースし直す（orjson があればそちらで）
+    global _PREFLOP_CACHE, _PREFLOP_MTIME
+    try:
+        mtime = os.path.getmtime(PREFLOP_DISTRIBUTIONS_PATH)
+    except OSError:
+        return None
+    if _PREFLOP_CACHE is not None and mtime == _PREFLOP_MTIME:
+        return _PREFLOP_CACHE
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-            key = _get_preflop_key(my_hand)
-            return data.get(key)
+        with open(PREFLOP_DISTRIBUTIONS_PATH, 'rb') as f:
+            raw = f.read()
+        _PREFLOP_CACHE = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        _PREFLOP_MTIME = mtime
     except: return None
+    return _PREFLOP_CACHE
 
-def calculate_equity(my_hand: Hand, board: Board, num_opponents: int, num_simulations: int = 1000) -> float:
+def _load_precomputed_preflop(my_hand: Hand) -> Optional[Dict[str, float]]:
+    data = _preflop_table()
+    if data is None: return None
+    entry = data.get(_get_preflop_key(my_hand))
+    return dict(entry) if entry else None
+
+def calculate_equity(my_hand: Hand, board: Board, num_opponents: int, num_simulations: int = 1000,
+                     tol: float = 0.02, min_simulations: int = 100) -> float:
+    """
+    試行ごとに Board / Hand を組み立てず、カード整数の配列のまま評価するコンパイル済みの経路に任せる。
+    min_simulations 試行から始めて回数を倍々に増やし、勝率の 95% 信頼区間の半幅
+    1.96·√(p(1-p)/n) が tol を下回ったら num_simulations を待たずに打ち切る（tol=0 なら常に全試行）。
+    """
     if num_opponents <= 0: return 1.0
-    full_deck = create_deck()
-    known_cards = list(my_hand.cards) + list(board.get_all_cards())
-    remaining_deck = [c for c in full_deck if c not in known_cards]
+    if tol <= 0 or num_simulations <= min_simulations:
+        return _sim_equity(my_hand, board, num_opponents, num_simulations)
     wins = 0.0
-    for _ in range(num_simulations):
-        current_deck = remaining_deck.copy()
-        random.shuffle(current_deck)
-        sim_board = Board()
-        if board.flops: sim_board.set_flops(board.flops)
-        else: sim_board.set_flops((current_deck.pop(), current_deck.pop(), current_deck.pop()))
-        if board.turn: sim_board.set_turn(board.turn)
-        else: sim_board.set_turn(current_deck.pop())
-        if board.river: sim_board.set_river(board.river)
-        else: sim_board.set_river(current_deck.pop())
-        my_score = evaluate_hand(my_hand, sim_board).value
-        opponent_scores = []
-        for _ in range(num_opponents):
-            opp_hand = Hand((current_deck.pop(), current_deck.pop()))
-            opp_score = evaluate_hand(opp_hand, sim_board).value
-            opponent_scores.append(opp_score)
-        max_opp_score = max(opponent_scores)
-        if my_score > max_opp_score: wins += 1.0
-        elif my_score == max_opp_score:
-            num_winners = opponent_scores.count(max_opp_score) + 1
-            wins += 1.0 / num_winners
-    return wins / num_simulations
+    n = 0
+    k = min_simulations
+    while True:
+        wins += _sim_equity(my_hand, board, num_opponents, k) * k
+        n += k
+        p = wins / n
+        if n >= num_simulations or 1.96 * math.sqrt(p * (1.0 - p) / n) < tol:
+            return p
+        # カーネル呼び出しの固定費を抑えるため、次はそれまでと同じ回数（合計が倍）だけ回す
+        k = min(n, num_simulations - n)
+
+# calculate_equity_cached が覚えておく勝率の上限（超えたら丸ごと捨てる）
+_EQUITY_CACHE_SIZE = 4096
+_EQUITY_CACHE: Dict[tuple, float] = {}
+
+def calculate_equity_cached(my_hand: Hand, board: Board, num_opponents: int, num_simulations: int = 1000) -> float:
+    """
+    表示用の勝率。プリフロップは preflop_equity.npy の表を引き、それ以外は
+    同じ (手札, ボード, 人数, 試行数) に対する calculate_equity の結果を使い回す
+    （同じストリートで手番が何度回ってきても、モンテカルロは最初の1回だけ）。
+    """
+    if num_opponents <= 0: return 1.0
+    if board.card_count == 0:
+        equity = preflop_equity(my_hand, num_opponents)
+        if equity is not None:
+            return equity
+    key = (my_hand.mask, board.mask, num_opponents, num_simulations)
+    equity = _EQUITY_CACHE.get(key)
+    if equity is None:
+        if len(_EQUITY_CACHE) >= _EQUITY_CACHE_SIZE:
+            _EQUITY_CACHE.clear()
+        equity = _EQUITY_CACHE[key] = calculate_equity(my_hand, board, num_opponents, num_simulations)
+    return equity
 
 if __name__ == "__main__":
     from card import Card
@@ -139,7 +187,6 @@ if __name__ == "__main__":
     print(f"AA Preflop: {dist.get('TWO_PAIR', 0):.2%}")
     
     print("\nFlop Test (sA sK, board s2 s3 c4)...")
-    flop_board = Board()
-    flop_board.set_flops((Card('s', 2), Card('s', 3), Card('c', 4)))
+    flop_board = Board.from_cards((Card('s', 2), Card('s', 3), Card('c', 4)))
     dist_flop = calculate_hand_distribution(Hand((Card('s', 14), Card('s', 13))), flop_board)
     print(f"Flush probability: {dist_flop.get('FLUSH', 0):.2%}")
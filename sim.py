@@ -0,0 +1,617 @@
+"""
+sim.py
+
+ヘッズアップのエクイティを一括モンテカルロで求めるバルクシミュレーションと、
+GtoCpu の意思決定で使う多人数エクイティカーネル（mc_equity）。
+
+Card / Hand / Board オブジェクトはドライバ（simulate）で card_int に変換するだけで、
+ホットパス（run_trials）は整数配列と fast_eval の7枚テーブルから作った配列のみを扱う。
+
+- numba が利用可能な場合: @njit(parallel=True) でコンパイルし、prange でスレッド並列化
+  （コンパイル結果はディスクにキャッシュし、実行中は GIL を解放する）
+- 利用できない場合: 同じコードを純 Python として実行（遅いが結果は同じ）。
+  CPU のエクイティは numpy で試行方向にベクトル化した calculate_equity_np を使う
+
+GtoCpu・CpuAgent 系・BayesianCpu は numba がある場合のみ mc_equity を使う。対話プレイの勝率・役分布表示（probability）も
+ここのカーネル（calculate_equity_nb / category_counts）を使い、
+precompute_preflop.py は preflop_category_counts で役分布表を作る。
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+from itertools import combinations_with_replacement
+
+from fast_eval import FLUSH7_LOOKUP, FLUSH_SUIT, NOFLUSH7_LOOKUP, _PRIMES, _cached_tables
+
+try:
+    from numba import njit, prange
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):  # type: ignore[no-redef]
+        """numba がない環境では何もしないデコレータ"""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+    prange = range  # type: ignore[assignment]
+
+
+# ── fast_eval の7枚テーブルを numpy 配列化（njit 関数からはグローバル定数として参照）──
+_FLUSH7 = np.array(FLUSH7_LOOKUP, dtype=np.int64)
+_FLUSH_SUIT = np.array(FLUSH_SUIT, dtype=np.int64)
+
+
+def _build_quinary_tables() -> tuple[np.ndarray, np.ndarray]:
+    """
+    非フラッシュ7枚の完全ハッシュ（PH Evaluator 方式）用テーブルを作る。
+
+    13ランクの枚数列 q（各 0〜4、合計7）を辞書順の通し番号 0..49204 に写す。
+    _DPQ[i, q_i, k] は「位置 i に q_i 未満を置いた列の数」（k は位置 i 以降の残り枚数）で、
+    通し番号は Σ _DPQ[i, q_i, k_i] になる。値は NOFLUSH7_LOOKUP から詰め替える。
+    """
+    # nq[n][k]: 長さ n・各桁 0〜4 で合計 k になる列の数
+    nq = np.zeros((14, 8), dtype=np.int64)
+    nq[0, 0] = 1
+    for n in range(1, 14):
+        for k in range(8):
+            nq[n, k] = sum(nq[n - 1, k - d] for d in range(min(k, 4) + 1))
+    dpq = np.zeros((13, 5, 8), dtype=np.int64)
+    for i in range(13):
+        for q in range(5):
+            for k in range(8):
+                dpq[i, q, k] = sum(nq[12 - i, k - d] for d in range(q) if k - d >= 0)
+
+    table = np.zeros(nq[13, 7], dtype=np.int64)
+    # 約 5 万列 × 13 桁を引くので、numpy スカラーではなく Python のリストで回す（import 時間の短縮）
+    dpq_l = dpq.tolist()
+    for ranks in combinations_with_replacement(range(13), 7):
+        q = [0] * 13
+        key = 1
+        for r in ranks:
+            q[r] += 1
+            key *= _PRIMES[r]
+        if max(q) > 4:
+            continue
+        idx = 0
+        k = 7
+        for i in range(13):
+            idx += dpq_l[i][q[i]][k]
+            k -= q[i]
+        table[idx] = NOFLUSH7_LOOKUP[key]
+    return dpq, table
+
+
+def _build_quinary_arrays() -> dict[str, np.ndarray]:
+    dpq, table = _build_quinary_tables()
+    return {"dpq": dpq, "noflush7": table}
+
+
+# fast_eval のテーブルと同じく __pycache__ にキャッシュする
+_T = _cached_tables(
+    "sim_tables", ("dpq", "noflush7"), _build_quinary_arrays,
+    lambda t: t["dpq"].shape == (13, 5, 8) and t["noflush7"].shape == (49205,),
+)
+_DPQ, _NOFLUSH7 = _T["dpq"], _T["noflush7"]
+del _T
+
+# 52bit マスクのビット位置（suit*13 + rank_idx）→ card_int（rank_idx*4 + suit）
+_INT_ID_FOR_MASK_BIT = np.array([(b % 13) * 4 + b // 13 for b in range(52)], dtype=np.int64)
+_MASK_BIT_POS = np.arange(52, dtype=np.int64)
+
+
+def remaining_cards(known_mask: int) -> np.ndarray:
+    """Hand / Board の mask の OR に含まれないカードの card_int 配列（int64、マスクのビット順）"""
+    return _INT_ID_FOR_MASK_BIT[(np.int64(known_mask) >> _MASK_BIT_POS) & 1 == 0]
+
+
+# 並列実行時の分割数（各チャンクがデッキのコピーを1つ持つ）
+_N_CHUNKS = 64
+
+
+@njit(cache=True, nogil=True)
+def eval7_nb(cards7: np.ndarray) -> int:
+    """fast_eval.eval7 の njit 版（同一スケールのスコアを返す）。非フラッシュは完全ハッシュで引く"""
+    q = np.zeros(13, dtype=np.int64)
+    sk = 0
+    for j in range(7):
+        c = cards7[j]
+        q[c >> 2] += 1
+        sk += 1 << (3 * (c & 3))
+    s = _FLUSH_SUIT[sk]
+    if s >= 0:
+        m = 0
+        for j in range(7):
+            c = cards7[j]
+            if c & 3 == s:
+                m |= 1 << (c >> 2)
+        return _FLUSH7[m]
+    idx = 0
+    k = 7
+    for i in range(13):
+        idx += _DPQ[i, q[i], k]
+        k -= q[i]
+        if k == 0:
+            break
+    return _NOFLUSH7[idx]
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def run_trials(remaining_deck: np.ndarray, hero: np.ndarray, villain: np.ndarray,
+               board: np.ndarray, n: int, seed: int = -1) -> tuple[int, int, int]:
+    """
+    不足しているボードカードを部分 Fisher-Yates で引き、hero と villain を n 回比較する。
+
+    remaining_deck: 未使用の card_int 配列
+    hero, villain:  各2枚の card_int 配列
+    board:          既知のボード card_int 配列（0〜5枚）
+    seed:           0 以上ならチャンク ci ごとに seed + ci でスレッドの乱数状態を初期化する（再現用）
+    戻り値: (hero の勝ち数, 負け数, 引き分け数)
+    """
+    n_board = board.shape[0]
+    n_draw = 5 - n_board
+    n_chunks = min(_N_CHUNKS, max(n, 1))
+    wins = np.zeros(n_chunks, dtype=np.int64)
+    losses = np.zeros(n_chunks, dtype=np.int64)
+    ties = np.zeros(n_chunks, dtype=np.int64)
+
+    for ci in prange(n_chunks):
+        if seed >= 0:
+            np.random.seed(seed + ci)
+        deck = remaining_deck.copy()
+        m = deck.shape[0]
+        h7 = np.empty(7, dtype=np.int64)
+        v7 = np.empty(7, dtype=np.int64)
+        h7[0] = hero[0]
+        h7[1] = hero[1]
+        v7[0] = villain[0]
+        v7[1] = villain[1]
+        for j in range(n_board):
+            h7[2 + j] = board[j]
+            v7[2 + j] = board[j]
+
+        w = 0
+        l = 0
+        t = 0
+        for _ in range(ci * n // n_chunks, (ci + 1) * n // n_chunks):
+            # 先頭 n_draw 枚だけを部分 Fisher-Yates で入れ替える
+            for j in range(n_draw):
+                r = np.random.randint(j, m)
+                tmp = deck[j]
+                deck[j] = deck[r]
+                deck[r] = tmp
+                h7[2 + n_board + j] = deck[j]
+                v7[2 + n_board + j] = deck[j]
+            hs = eval7_nb(h7)
+            vs = eval7_nb(v7)
+            if hs > vs:
+                w += 1
+            elif hs < vs:
+                l += 1
+            else:
+                t += 1
+        wins[ci] = w
+        losses[ci] = l
+        ties[ci] = t
+
+    return wins.sum(), losses.sum(), ties.sum()
+
+
+def simulate(hand_a, hand_b, board_known, n_trials: int,
+             seed: int | None = None) -> tuple[int, int, int]:
+    """
+    hand_a 対 hand_b のオールイン勝敗を n_trials 回シミュレーションする。
+
+    hand_a, hand_b: Hand オブジェクト
+    board_known:    Board オブジェクト（未完成でもよい）
+    seed:           指定すると同じ結果を再現できる（スレッド数に依存しない）
+    戻り値: (hand_a の勝ち数, 負け数, 引き分け数)
+    """
+    hero = np.array([c.int_id for c in hand_a.cards], dtype=np.int64)
+    villain = np.array([c.int_id for c in hand_b.cards], dtype=np.int64)
+    board = np.array([c.int_id for c in board_known.iter_cards()], dtype=np.int64)
+
+    remaining = remaining_cards(hand_a.mask | hand_b.mask | board_known.mask)
+    w, l, t = run_trials(remaining, hero, villain, board, n_trials, -1 if seed is None else seed)
+    return int(w), int(l), int(t)
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def mc_equity(remaining_deck: np.ndarray, hero: np.ndarray, board: np.ndarray,
+              n_opp: int, n: int, seed: int = -1) -> float:
+    """
+    hero の n_opp 人相手のエクイティを n 回のモンテカルロで求める（引き分けは等分）。
+
+    remaining_deck: 未使用の card_int 配列
+    hero:           2枚の card_int 配列
+    board:          既知のボード card_int 配列（0〜5枚）
+    seed:           0 以上ならチャンク ci ごとに seed + ci で乱数状態を初期化する
+    """
+    n_board = board.shape[0]
+    n_draw = 5 - n_board
+    n_chunks = min(_N_CHUNKS, max(n, 1))
+    shares = np.zeros(n_chunks, dtype=np.float64)
+
+    for ci in prange(n_chunks):
+        if seed >= 0:
+            np.random.seed(seed + ci)
+        deck = remaining_deck.copy()
+        m = deck.shape[0]
+        h7 = np.empty(7, dtype=np.int64)
+        o7 = np.empty(7, dtype=np.int64)
+        h7[0] = hero[0]
+        h7[1] = hero[1]
+        for j in range(n_board):
+            h7[2 + j] = board[j]
+
+        s = 0.0
+        for _ in range(ci * n // n_chunks, (ci + 1) * n // n_chunks):
+            # ボード不足分 + 相手の手札 2枚×n_opp を部分 Fisher-Yates で引く
+            for j in range(n_draw + 2 * n_opp):
+                r = np.random.randint(j, m)
+                tmp = deck[j]
+                deck[j] = deck[r]
+                deck[r] = tmp
+            for j in range(n_draw):
+                h7[2 + n_board + j] = deck[j]
+            for j in range(2, 7):
+                o7[j] = h7[j]
+            hs = eval7_nb(h7)
+
+            best = 0
+            tie_count = 0
+            ptr = n_draw
+            for _k in range(n_opp):
+                o7[0] = deck[ptr]
+                o7[1] = deck[ptr + 1]
+                os_ = eval7_nb(o7)
+                if os_ > best:
+                    best = os_
+                    tie_count = 1
+                elif os_ == best:
+                    tie_count += 1
+                ptr += 2
+
+            if hs > best:
+                s += 1.0
+            elif hs == best:
+                s += 1.0 / (tie_count + 1)
+        shares[ci] = s
+
+    return shares.sum() / max(n, 1)
+
+
+def calculate_equity_nb(my_hand, board, num_opponents: int,
+                        num_simulations: int = 400,
+                        rng: np.random.Generator | None = None) -> float:
+    """
+    Hand / Board からエクイティを返す mc_equity のアダプタ。
+
+    Hand / Board は呼び出しごとに1回だけ card_int 配列へ変換する。
+    rng を渡すとそこから seed を引くので、同じ Generator 状態なら結果も再現される。
+    """
+    if num_opponents <= 0:
+        return 1.0
+    hero = np.array([c.int_id for c in my_hand.cards], dtype=np.int64)
+    board_arr = np.array([c.int_id for c in board.iter_cards()], dtype=np.int64)
+    remaining = remaining_cards(my_hand.mask | board.mask)
+    seed = -1 if rng is None else int(rng.integers(0, 2 ** 31 - _N_CHUNKS))
+    return float(mc_equity(remaining, hero, board_arr, num_opponents, num_simulations, seed))
+
+
+# ── numba なし環境向けの numpy 一括評価（試行方向にベクトル化）──
+_RANKS13 = np.arange(13)
+_DPQ_FLAT = _DPQ.ravel()   # _DPQ[i, q, k] == _DPQ_FLAT[i*40 + q*8 + k]
+_SUIT_W = 1 << (3 * np.arange(4))
+
+
+def eval7_np(cards: np.ndarray) -> np.ndarray:
+    """
+    eval7_nb の numpy 版。cards: (S, 7) の card_int 行列 → (S,) のスコア。
+
+    スートごとの枚数は 3bit ずつ詰めた和を _FLUSH_SUIT で引き、フラッシュ行はランクの
+    ビットマスクを _FLUSH7 で、それ以外はランク枚数列の完全ハッシュを _NOFLUSH7 で引く。
+    """
+    ranks = cards >> 2
+    suits = cards & 3
+    flush_suit = _FLUSH_SUIT[_SUIT_W[suits].sum(axis=1)]
+    in_flush = suits == flush_suit[:, None]
+    flush_mask = np.where(in_flush, 1 << ranks, 0).sum(axis=1)
+    n = cards.shape[0]
+    # 行ごとのランク枚数 (S, 13) は行オフセット付きの bincount 1 回で数える
+    q = np.bincount((ranks + 13 * np.arange(n)[:, None]).ravel(), minlength=13 * n).reshape(n, 13)
+    k = 7 - (np.cumsum(q, axis=1) - q)
+    idx = _DPQ_FLAT[_RANKS13 * 40 + q * 8 + k].sum(axis=1)
+    return np.where(flush_suit >= 0, _FLUSH7[flush_mask], _NOFLUSH7[idx])
+
+
+def calculate_equity_np(my_hand, board, num_opponents: int,
+                        num_simulations: int = 400,
+                        rng: np.random.Generator | None = None) -> float:
+    """
+    calculate_equity_nb と同じ引数・戻り値の numpy 版（numba がない環境の GtoCpu 用）。
+
+    全試行分の残りカードを一括で引き、hero と各相手の 7 枚を (S, 7) 行列にして
+    eval7_np で評価するので、試行ごとの Python ループがない。引き分けは等分する。
+    """
+    if num_opponents <= 0:
+        return 1.0
+    if rng is None:
+        rng = np.random.default_rng()
+    hero = np.array([c.int_id for c in my_hand.cards], dtype=np.int64)
+    board_arr = np.array([c.int_id for c in board.iter_cards()], dtype=np.int64)
+    remaining = remaining_cards(my_hand.mask | board.mask)
+    n = num_simulations
+    n_draw = 5 - board_arr.shape[0]
+    n_need = n_draw + 2 * num_opponents
+    vals = rng.random((n, remaining.shape[0]))
+    drawn = remaining[np.argpartition(vals, n_need - 1, axis=1)[:, :n_need]]
+
+    board7 = np.concatenate([np.broadcast_to(board_arr, (n, board_arr.shape[0])), drawn[:, :n_draw]], axis=1)
+    hero_score = eval7_np(np.concatenate([np.broadcast_to(hero, (n, 2)), board7], axis=1))
+    best = np.zeros(n, dtype=np.int64)
+    ties = np.zeros(n, dtype=np.int64)
+    for j in range(num_opponents):
+        opp = drawn[:, n_draw + 2 * j:n_draw + 2 * j + 2]
+        score = eval7_np(np.concatenate([opp, board7], axis=1))
+        ties = np.where(score > best, 1, ties + (score == best))
+        best = np.maximum(best, score)
+    shares = np.where(hero_score > best, 1.0, np.where(hero_score == best, 1.0 / (ties + 1), 0.0))
+    return float(shares.mean())
+
+
+# CPU・勝率表示のモンテカルロ勝率はこれを使う（numba があれば JIT カーネル、なければ numpy 一括評価）
+calculate_equity = calculate_equity_nb if _NUMBA_AVAILABLE else calculate_equity_np
+
+
+_warmed_up = False
+
+
+def warmup() -> None:
+    """njit 関数を一度だけ実行してコンパイル（またはキャッシュ読込）を済ませる"""
+    global _warmed_up
+    if _warmed_up or not _NUMBA_AVAILABLE:
+        return
+    deck = np.arange(4, 52, dtype=np.int64)
+    hero = np.array([0, 1], dtype=np.int64)
+    mc_equity(deck, hero, np.empty(0, dtype=np.int64), 1, 1, 0)
+    run_trials(deck, hero, np.array([2, 3], dtype=np.int64),
+               np.empty(0, dtype=np.int64), 1, 0)
+    batch_equity(hero, np.empty(0, dtype=np.int64), deck[:9].reshape(1, 9), 1)
+    _warmed_up = True
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def batch_equity(hero: np.ndarray, board: np.ndarray, rollouts: np.ndarray, n_opp: int) -> float:
+    """
+    共有ロールアウト行列に対する hero のエクイティ（引き分けは等分）。
+
+    rollouts: (n_sims, K) の card_int 行列。各行は「ボード以外の残りカード」の
+              一様ランダムな並びの先頭 K 枚（LearningGame.prepare_street_rollouts）。
+    各行から hero の2枚を読み飛ばした先頭 5-|board|+2*n_opp 枚を使うので、
+    hero ごとに引き直さなくても hero の手札を除いた一様サンプルになる。
+    K は 5-|board|+2*n_opp+2 以上であること。
+    """
+    n = rollouts.shape[0]
+    k = rollouts.shape[1]
+    n_board = board.shape[0]
+    n_draw = 5 - n_board
+    n_need = n_draw + 2 * n_opp
+    shares = np.zeros(n, dtype=np.float64)
+
+    for i in prange(n):
+        h7 = np.empty(7, dtype=np.int64)
+        o7 = np.empty(7, dtype=np.int64)
+        drawn = np.empty(n_need, dtype=np.int64)
+        h7[0] = hero[0]
+        h7[1] = hero[1]
+        for j in range(n_board):
+            h7[2 + j] = board[j]
+        cnt = 0
+        for j in range(k):
+            c = rollouts[i, j]
+            if c == hero[0] or c == hero[1]:
+                continue
+            drawn[cnt] = c
+            cnt += 1
+            if cnt == n_need:
+                break
+        for j in range(n_draw):
+            h7[2 + n_board + j] = drawn[j]
+        for j in range(2, 7):
+            o7[j] = h7[j]
+        hs = eval7_nb(h7)
+
+        best = 0
+        tie_count = 0
+        ptr = n_draw
+        for _k in range(n_opp):
+            o7[0] = drawn[ptr]
+            o7[1] = drawn[ptr + 1]
+            os_ = eval7_nb(o7)
+            if os_ > best:
+                best = os_
+                tie_count = 1
+            elif os_ == best:
+                tie_count += 1
+            ptr += 2
+
+        if hs > best:
+            shares[i] = 1.0
+        elif hs == best:
+            shares[i] = 1.0 / (tie_count + 1)
+
+    return shares.sum() / max(n, 1)
+
+
+def batch_equity_for(my_hand, board, num_opponents: int, rollouts: np.ndarray) -> float | None:
+    """
+    batch_equity のアダプタ。rollouts の列数が足りない（相手が想定より多い）場合は None。
+    """
+    if num_opponents <= 0:
+        return 1.0
+    if rollouts.shape[1] < 5 - board.card_count + 2 * num_opponents + 2:
+        return None
+    hero = np.array([c.int_id for c in my_hand.cards], dtype=np.int64)
+    board_arr = np.array([c.int_id for c in board.iter_cards()], dtype=np.int64)
+    return float(batch_equity(hero, board_arr, rollouts, num_opponents))
+
+
+# ── 全組み合わせの役カテゴリ分布（probability.calculate_hand_distribution 用）──
+# 役カテゴリ（score // 15**6）の数（HIGH_CARD 〜 ROYAL_FLUSH）
+N_CATEGORIES = 10
+_CATEGORY_DIV = 15 ** 6
+
+
+@njit(cache=True, nogil=True)
+def category_counts(fixed: np.ndarray, remaining: np.ndarray, k: int) -> np.ndarray:
+    """
+    既知の fixed（card_int, 7-k 枚）に remaining から k 枚を足す全組み合わせを eval7_nb で評価し、
+    役カテゴリ（score // 15**6）ごとの件数 (N_CATEGORIES,) を返す。
+    組み合わせは辞書順の添字配列をその場で進めて列挙するので、タプルのリストは作らない。
+    """
+    counts = np.zeros(N_CATEGORIES, dtype=np.int64)
+    n = remaining.shape[0]
+    nf = fixed.shape[0]
+    cards = np.empty(nf + k, dtype=np.int64)
+    cards[:nf] = fixed
+    idx = np.arange(k)
+    while True:
+        for j in range(k):
+            cards[nf + j] = remaining[idx[j]]
+        counts[eval7_nb(cards) // _CATEGORY_DIV] += 1
+        # 次の組み合わせ: 右端から進められる位置を探し、それより右を詰め直す
+        i = k - 1
+        while i >= 0 and idx[i] == n - k + i:
+            i -= 1
+        if i < 0:
+            break
+        idx[i] += 1
+        for j in range(i + 1, k):
+            idx[j] = idx[j - 1] + 1
+    return counts
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def preflop_category_counts(hands: np.ndarray) -> np.ndarray:
+    """
+    手札 hands（card_int, (H, 2)）それぞれについて、重ならない全ボード 5 枚での役カテゴリ件数
+    (H, N_CATEGORIES) を返す（precompute_preflop.py 用）。
+    C(52,5) のボードを一度だけ列挙し、ボード側のランク枚数・スートキー・スート別ランクマスクを
+    先に作っておいて、各手札はその上に 2 枚を足し引きして評価する。1 枚目のカードで prange 並列化する。
+
+    どの手札もスート 2・3 を使っていなければ、その2スートを入れ替えたボードは同じ件数を与えるので、
+    入れ替えた像とのうちマスクの小さい方だけを評価して 2 倍（入れ替えで不変なボードは 1 倍）で数える。
+    """
+    H = hands.shape[0]
+    partial = np.zeros((48, H, N_CATEGORIES), dtype=np.int64)
+    hand_masks = np.zeros(H, dtype=np.int64)
+    swap_ok = True
+    for h in range(H):
+        hand_masks[h] = (np.int64(1) << hands[h, 0]) | (np.int64(1) << hands[h, 1])
+        if hands[h, 0] & 2 or hands[h, 1] & 2:
+            swap_ok = False
+    for a in prange(48):
+        counts = partial[a]
+        q = np.zeros(13, dtype=np.int64)
+        suit_masks = np.zeros(4, dtype=np.int64)
+        board = np.empty(5, dtype=np.int64)
+        board[0] = a
+        for b in range(a + 1, 49):
+            board[1] = b
+            for c in range(b + 1, 50):
+                board[2] = c
+                for d in range(c + 1, 51):
+                    board[3] = d
+                    for e in range(d + 1, 52):
+                        board[4] = e
+                        board_mask = np.int64(0)
+                        swapped_mask = np.int64(0)
+                        for j in range(5):
+                            x = board[j]
+                            board_mask |= np.int64(1) << x
+                            # スート 2 ↔ 3 の入れ替え（card_int の下位ビットを反転）
+                            swapped_mask |= np.int64(1) << (x ^ ((x >> 1) & 1))
+                        w = 1
+                        if swap_ok and swapped_mask != board_mask:
+                            if swapped_mask < board_mask:
+                                continue
+                            w = 2
+                        sk = 0
+                        q[:] = 0
+                        suit_masks[:] = 0
+                        for j in range(5):
+                            x = board[j]
+                            q[x >> 2] += 1
+                            sk += 1 << (3 * (x & 3))
+                            suit_masks[x & 3] |= 1 << (x >> 2)
+                        for h in range(H):
+                            if hand_masks[h] & board_mask:
+                                continue
+                            x, y = hands[h, 0], hands[h, 1]
+                            s = _FLUSH_SUIT[sk + (1 << (3 * (x & 3))) + (1 << (3 * (y & 3)))]
+                            if s >= 0:
+                                m = suit_masks[s]
+                                if x & 3 == s:
+                                    m |= 1 << (x >> 2)
+                                if y & 3 == s:
+                                    m |= 1 << (y >> 2)
+                                score = _FLUSH7[m]
+                            else:
+                                q[x >> 2] += 1
+                                q[y >> 2] += 1
+                                idx = 0
+                                k = 7
+                                for i in range(13):
+                                    idx += _DPQ[i, q[i], k]
+                                    k -= q[i]
+                                    if k == 0:
+                                        break
+                                score = _NOFLUSH7[idx]
+                                q[x >> 2] -= 1
+                                q[y >> 2] -= 1
+                            counts[h, score // _CATEGORY_DIV] += w
+    return partial.sum(axis=0)
+
+
+# ── プリフロップ・エクイティ表（precompute_preflop.py --equity で生成）──
+PREFLOP_EQUITY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_equity.npy")
+
+
+def preflop_class(r1: int, r2: int, suited: bool) -> int:
+    """スターティングハンドを 13x13 グリッドの通し番号 0..168 に写す（ペアは対角、スーテッドは上三角）"""
+    hi, lo = max(r1, r2) - 2, min(r1, r2) - 2
+    return hi * 13 + lo if suited else lo * 13 + hi
+
+
+def _load_preflop_equity() -> np.ndarray | None:
+    """エクイティ表 float32[169, 最大対戦人数] を読み込む（無ければ None）"""
+    try:
+        return np.load(PREFLOP_EQUITY_PATH)
+    except (OSError, ValueError):
+        return None
+
+
+_PREFLOP_EQUITY = _load_preflop_equity()
+_PREFLOP_EQUITY_AVAILABLE = _PREFLOP_EQUITY is not None
+
+
+def preflop_equity(my_hand, num_opponents: int) -> float | None:
+    """
+    ランダムハンド num_opponents 人に対するプリフロップのエクイティを表から引く。
+    表が無い場合は None（呼び出し側でモンテカルロにフォールバックする）。
+    表の上限を超える人数は上限の値で代用する。
+    """
+    if _PREFLOP_EQUITY is None:
+        return None
+    if num_opponents <= 0:
+        return 1.0
+    c1, c2 = my_hand.cards
+    a, b = c1.int_id, c2.int_id
+    cls = preflop_class((a >> 2) + 2, (b >> 2) + 2, (a & 3) == (b & 3))
+    n = min(num_opponents, _PREFLOP_EQUITY.shape[1])
+    return float(_PREFLOP_EQUITY[cls, n - 1])
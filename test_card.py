@@ -0,0 +1,36 @@
+import random
+import unittest
+
+from card import MASTER_DECK, Deck
+
+class TestDeck(unittest.TestCase):
+    def test_seeded_draws_are_distinct(self):
+        """draw / draw_n で引いたカードが重複せず、残り枚数が減っていくことを確認"""
+        deck = Deck(rng=random.Random(7))
+        self.assertEqual(len(deck), 52)
+        drawn = [deck.draw()]
+        self.assertEqual(len(deck), 51)
+        drawn += deck.draw_n(5)
+        self.assertEqual(len(deck), 46)
+        drawn += deck.draw_n(len(deck))
+        self.assertEqual(len(deck), 0)
+        self.assertEqual(sorted(c.int_id for c in drawn), sorted(c.int_id for c in MASTER_DECK))
+        with self.assertRaises(IndexError):
+            deck.draw()
+
+    def test_same_seed_same_draws(self):
+        """同じ seed の乱数生成器なら同じ順番でカードが配られることを確認"""
+        a = Deck(rng=random.Random(11)).draw_n(9)
+        b = Deck(rng=random.Random(11)).draw_n(9)
+        self.assertEqual([c.int_id for c in a], [c.int_id for c in b])
+
+    def test_reset_restores_full_deck(self):
+        """reset() で 52 枚に戻り、再び全カードを引けることを確認"""
+        deck = Deck(rng=random.Random(3))
+        deck.draw_n(20)
+        deck.reset()
+        self.assertEqual(len(deck), 52)
+        self.assertEqual(len({c.int_id for c in deck.draw_n(52)}), 52)
+
+if __name__ == '__main__':
+    unittest.main()
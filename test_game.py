@@ -1,19 +1,17 @@
 import unittest
-from game import Game
-from player import Player
+from game import Game, _build_side_pots
+from player import Player, Status
 
 class MockPlayer(Player):
     def __init__(self, name, chips, actions):
         super().__init__(name, chips)
-        self.actions = actions
-        self.action_index = 0
+        self._it = iter(actions)
+        self.seen_call_amounts = []
 
     def decide_action(self, valid_actions, game_state):
-        if self.action_index < len(self.actions):
-            action_data = self.actions[self.action_index]
-            self.action_index += 1
-            return action_data
-        return 'fold', 0
+        self.seen_call_amounts.append(game_state['call_amount'])
+        # スクリプトを使い切ったら fold
+        return next(self._it, ('fold', 0))
     
     def get_action(self, valid_actions, game_state):
         return self.decide_action(valid_actions, game_state)
@@ -21,42 +19,59 @@ class MockPlayer(Player):
 class TestGameBetting(unittest.TestCase):
     def test_min_raise_enforcement(self):
         """不正に低いレイズ額が入力されても、最小レイズ額が維持されることを確認"""
-        p1 = MockPlayer("You", 1000, [('raise', 60)])
-        p2 = MockPlayer("CPU", 1000, [('raise', 40)]) # 不正な額（現在の60より低い）
-        
-        game = Game([p1, p2], start_chips=1000, sb=10, bb=20)
-        # プリフロップ開始状態を擬似的に作る
-        for p in game.players:
-            p.status = 'active'
-            p.round_bet = 0
-        
-        # p1(You)が60にレイズ
-        # p2(CPU)が40にレイズ(誤り)を試みる
-        
-        # betting_roundのロジックの一部をトレース
-        # 1. p1のアクション
-        game.betting_round(start_idx=0)
-        
-        # p2の round_bet が 80 (60 + BB) になっているはず
-        self.assertEqual(game.players[1].round_bet, 80)
-        # p1の次の手番でのコール額がマイナスにならないことを確認
-        # (p1.round_bet=60, round_max_bet=80 なので call_amount=20)
-        
+        # 現在の最大ベット60に対して40へのレイズ（誤り）は 80 (60 + BB) に切り上げられる
+        self.assertEqual(Game._legalize_raise(60, 40, 20), 80)
+        # 最小レイズ以上の額はそのまま
+        self.assertEqual(Game._legalize_raise(60, 100, 20), 100)
+
     def test_call_amount_calculation(self):
         """レイズ合戦の中でコール額が正しく計算されるか"""
-        p1 = MockPlayer("You", 1000, [('raise', 60), ('call', 20)])
-        p2 = MockPlayer("CPU", 1000, [('raise', 100)])
-        
+        # p1: raise 60 -> p2: raise 100 -> p1 のコール額は 100-60=40
+        self.assertEqual(Game._compute_call(60, 100), 40)
+        # 最大ベットに並んでいればコール額は0（チェック）
+        self.assertEqual(Game._compute_call(100, 100), 0)
+
+    def test_betting_round_raise_and_call(self):
+        """betting_round を通しで回し、最小レイズの切り上げとコール額がプレイヤーに届くことを確認"""
+        # p1: raise 60 -> p2: raise 40（不正、80 に切り上げ）-> p1: raise 120 -> p2: call
+        p1 = MockPlayer("You", 1000, [('raise', 60), ('raise', 120)])
+        p2 = MockPlayer("CPU", 1000, [('raise', 40), ('call', 0)])
+
         game = Game([p1, p2], start_chips=1000, sb=10, bb=20)
-        for p in game.players: p.status = 'active'
-        
+        for p in game.players:
+            p.status = Status.ACTIVE
+            p.round_bet = 0
+
         game.betting_round(start_idx=0)
-        
-        # p1: raise 60 -> p2: raise 100 -> p1: call (100-60=40のはずだが、
-        # MockPlayerに渡されるcall_amountが正しいか)
-        # このテストでは実行後のチップ残高などで間接的に確認
-        self.assertEqual(p1.chips, 1000 - 100) # 合計100支払っているはず
-        self.assertEqual(p2.chips, 1000 - 100)
+
+        # p2 のレイズが 80 に切り上げられていれば、p1 の2回目のコール額は 80-60=20
+        self.assertEqual(p1.seen_call_amounts, [0, 20])
+        # p1 の再レイズ（120）に対する p2 のコール額は 120-80=40
+        self.assertEqual(p2.seen_call_amounts, [60, 40])
+        self.assertEqual(p1.chips, 1000 - 120)
+        self.assertEqual(p2.chips, 1000 - 120)
+
+class TestSidePots(unittest.TestCase):
+    def test_short_all_in_winner_and_side_pot(self):
+        """ショートのオールインが勝つとメインポットだけを取り、サイドポットは次に強い手が取ることを確認"""
+        # 席0: 50 でオールイン（最強）、席1・2: 200 ずつ（席1 の方が強い）
+        pots = _build_side_pots([50, 200, 200], [30, 20, 10])
+        self.assertEqual(pots, [[[0], 150], [[1], 300]])
+
+    def test_folded_player_contributed_most(self):
+        """ショーダウン参加者より多く拠出して降りたプレイヤーの分は、参加者の拠出額までしか配られないことを確認"""
+        # 席0 は 100 拠出して fold（-1）。席1・2 は 50 でショーダウン
+        pots = _build_side_pots([100, 50, 50], [-1, 20, 10])
+        # 50 までの段階は 3人分（150）を席1 が取る。席0 の 50 を超える分は誰の取り分にもならない
+        self.assertEqual(pots, [[[1], 150]])
+
+    def test_split_pot_lists_lowest_seat_first(self):
+        """引き分けの勝者は席番号の昇順で並び、端数チップを受け取る winners[0] が最も若い席になることを確認"""
+        pots = _build_side_pots([25, 25, 25], [9, 3, 9])
+        self.assertEqual(pots, [[[0, 2], 75]])
+        winners, amount = pots[0]
+        # showdown は amount % len(winners) の端数を winners[0] に渡す
+        self.assertEqual((winners[0], amount % len(winners)), (0, 1))
 
 if __name__ == '__main__':
     unittest.main()
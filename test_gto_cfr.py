@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+
+from gto_cfr import _INITIAL_CAPACITY, SimpleMCCFR
+
+class TestCfrPersistence(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "gto_strategy.npz")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _loaded(self) -> SimpleMCCFR:
+        cfr = SimpleMCCFR()
+        cfr.load(self.path)
+        return cfr
+
+    def test_save_log_delta_load_round_trip(self):
+        """save → log_delta → load で同じテーブルに戻ることを確認"""
+        cfr = SimpleMCCFR()
+        cfr.update_regret("flop|A", "call", {"fold": 0.0, "call": 1.0, "raise_67": 3.0})
+        cfr.save(self.path)
+        # スナップショット後の変更（既存行の更新と新しい行）は差分ログにだけ入る
+        cfr.update_regret("flop|A", "fold", {"fold": 0.0, "call": 2.0})
+        cfr.update_strategy_sum("turn|B", {"check": 0.25, "raise_33": 0.75})
+        cfr.log_delta(self.path)
+        self.assertTrue(os.path.exists(self.path + ".delta"))
+
+        self.assertEqual(self._loaded().to_dict(), cfr.to_dict())
+
+    def test_truncated_delta_loads_prefix(self):
+        """末尾が壊れた .delta は壊れる前のレコードまで読み込み、警告を出すことを確認"""
+        cfr = SimpleMCCFR()
+        cfr.save(self.path)
+        cfr.update_regret("flop|A", "call", {"fold": 0.0, "call": 1.0, "raise_67": 3.0})
+        cfr.log_delta(self.path)
+        first = cfr.to_dict()
+        cfr.update_regret("river|C", "call", {"call": 0.0, "raise_100": 5.0})
+        cfr.log_delta(self.path)
+
+        delta = self.path + ".delta"
+        with open(delta, "rb+") as f:
+            f.truncate(os.path.getsize(delta) - 5)
+
+        with self.assertWarns(UserWarning):
+            loaded = self._loaded()
+        self.assertEqual(loaded.to_dict(), first)
+
+    def test_save_removes_delta(self):
+        """save() がスナップショットに畳み込んだあと .delta を消すことを確認"""
+        cfr = SimpleMCCFR()
+        cfr.save(self.path)
+        cfr.update_regret("flop|A", "call", {"fold": 0.0, "call": 1.0, "raise_67": 3.0})
+        cfr.log_delta(self.path)
+        self.assertTrue(os.path.exists(self.path + ".delta"))
+
+        cfr.save(self.path)
+        self.assertFalse(os.path.exists(self.path + ".delta"))
+        self.assertEqual(self._loaded().to_dict(), cfr.to_dict())
+
+    def test_legacy_v4_json_migrates(self):
+        """npz が無く同名の v4 JSON（gto_strategy.json）があれば、それを読み込むことを確認"""
+        legacy = {
+            "_version": 4,
+            "regret_sum": {"flop|A": {"call": 1.5, "raise_67": 0.5}},
+            "strategy_sum": {"flop|A": {"call": 0.75, "fold": 0.25}},
+            "visit_count": {"flop|A": 7},
+        }
+        # visit_count にしかない状態で初期容量を超え、読み込み中に配列が伸びるようにする
+        n_extra = _INITIAL_CAPACITY + 100
+        legacy["visit_count"].update({f"turn|{i}": i + 1 for i in range(n_extra)})
+        with open(os.path.join(self._tmp.name, "gto_strategy.json"), "w") as f:
+            json.dump(legacy, f)
+
+        loaded = self._loaded()
+        self.assertEqual(len(loaded), n_extra + 1)
+        self.assertEqual(loaded.visits("flop|A"), 7)
+        self.assertEqual(loaded.visits(f"turn|{n_extra - 1}"), n_extra)
+        self.assertEqual(loaded.to_dict(), {k: legacy[k] for k in ("regret_sum", "strategy_sum", "visit_count")})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import fast_eval
+from card import RANKS_MAP, Board, Card, Hand
+from hand_strength import evaluate_hand, hand_value
+
+_RANK_OF = {s: r for r, s in RANKS_MAP.items()}
+
+def _cards(text):
+    """'Ah Kd' → [Card('h', 14), Card('d', 13)]"""
+    return [Card(t[1], _RANK_OF[t[0]]) for t in text.split()]
+
+class TestHandCategories(unittest.TestCase):
+    def _eval(self, hand, board):
+        """evaluate_hand の結果を返し、eval7 / hand_value のスコアが一致することも確認する"""
+        h = Hand(tuple(_cards(hand)))
+        b = Board.from_cards(_cards(board))
+        ev = evaluate_hand(h, b)
+        self.assertEqual(fast_eval.eval7([c.int_id for c in (*h.cards, *b.cards)]), ev.value)
+        self.assertEqual(hand_value(h, b), ev.value)
+        return ev
+
+    def test_wheel_loses_to_six_high_straight(self):
+        """A-5 のストレート（ホイール）は 6 ハイのストレートに負けることを確認"""
+        wheel = self._eval("As Kd", "2h 3d 4c 5s 9h")
+        six_high = self._eval("6c Qd", "2h 3d 4c 5s 9h")
+        self.assertEqual((wheel.hand_type, wheel.primary_rank), ('STRAIGHT', 5))
+        self.assertEqual((six_high.hand_type, six_high.primary_rank), ('STRAIGHT', 6))
+        self.assertGreater(six_high, wheel)
+
+    def test_steel_wheel_and_royal(self):
+        """A-5 のストレートフラッシュとロイヤルフラッシュの判定と強弱を確認"""
+        steel = self._eval("As 2s", "3s 4s 5s Kd 9h")
+        royal = self._eval("Ah Kh", "Qh Jh Th 2c 2d")
+        self.assertEqual((steel.hand_type, steel.primary_rank), ('STRAIGHT_FLUSH', 5))
+        self.assertEqual(royal.hand_type, 'ROYAL_FLUSH')
+        self.assertGreater(royal, steel)
+
+    def test_quads_use_best_kicker(self):
+        """フォーカードのキッカーに残りの最高ランクを使うことを確認"""
+        ace = self._eval("As 3d", "Ks Kh Kd Kc 2s")
+        queen = self._eval("Qs 3c", "Ks Kh Kd Kc 2s")
+        self.assertEqual((ace.hand_type, ace.kicker_ranks), ('FOUR_OF_A_KIND', (14,)))
+        self.assertEqual((queen.hand_type, queen.kicker_ranks), ('FOUR_OF_A_KIND', (12,)))
+        self.assertGreater(ace, queen)
+        # ボードのキッカーの方が強ければ手札は関係なく引き分け
+        self.assertEqual(self._eval("3s 4d", "Ks Kh Kd Kc As"), self._eval("5s 6d", "Ks Kh Kd Kc As"))
+
+    def test_three_pairs_on_seven_cards(self):
+        """7枚に3組のペアがあるときは上位2組のツーペアになることを確認"""
+        # 3組目のペア（5）は使わず、残りの最高ランク K がキッカーになる
+        ev = self._eval("9s 9h", "7c 7d 5s 5h Kc")
+        self.assertEqual((ev.hand_type, ev.primary_rank, ev.secondary_rank, ev.kicker_ranks),
+                         ('TWO_PAIR', 9, 7, (13,)))
+        lower = self._eval("Ad 2c", "7c 7d 5s 5h Kc")
+        self.assertEqual((lower.hand_type, lower.primary_rank, lower.secondary_rank, lower.kicker_ranks),
+                         ('TWO_PAIR', 7, 5, (14,)))
+        self.assertGreater(ev, lower)
+
+    def test_flush_beats_straight(self):
+        """同じボードでフラッシュがストレートに勝つことを確認"""
+        flush = self._eval("Ah 3h", "9h 8h 7c 6d 2h")
+        straight = self._eval("Tc Jc", "9h 8h 7c 6d 2h")
+        self.assertEqual(flush.hand_type, 'FLUSH')
+        self.assertEqual((straight.hand_type, straight.primary_rank), ('STRAIGHT', 11))
+        self.assertGreater(flush, straight)
+
+    def test_flushes_differing_in_fifth_card(self):
+        """5枚目のカードだけが違うフラッシュ同士の強弱を確認"""
+        four = self._eval("4h Qs", "Ah Kh 9h 7h 2c")
+        three = self._eval("3h Qd", "Ah Kh 9h 7h 2c")
+        self.assertEqual((four.hand_type, four.kicker_ranks), ('FLUSH', (13, 9, 7, 4)))
+        self.assertEqual((three.hand_type, three.kicker_ranks), ('FLUSH', (13, 9, 7, 3)))
+        self.assertGreater(four, three)
+
+if __name__ == '__main__':
+    unittest.main()
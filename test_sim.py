@@ -0,0 +1,70 @@
+import random
+import unittest
+
+import numpy as np
+
+import fast_eval
+from card import Board, Card, Hand
+from probability import _evaluate_combination_batch
+from sim import (
+    _NUMBA_AVAILABLE, category_counts, eval7_nb, eval7_np, preflop_category_counts, remaining_cards, simulate,
+)
+
+def _card_ints(*cards):
+    return np.array([c.int_id for c in cards], dtype=np.int64)
+
+class TestSimKernels(unittest.TestCase):
+    def test_eval7_matches_fast_eval(self):
+        """eval7_nb / eval7_np がランダムな7枚で fast_eval.eval7 と同じスコアを返すことを確認"""
+        rng = random.Random(1234)
+        sets = [rng.sample(range(52), 7) for _ in range(2000)]
+        expected = [fast_eval.eval7(s) for s in sets]
+        self.assertEqual([int(eval7_nb(np.array(s, dtype=np.int64))) for s in sets], expected)
+        self.assertEqual(eval7_np(np.array(sets, dtype=np.int64)).tolist(), expected)
+
+    def test_category_counts_matches_fallback(self):
+        """category_counts がフロップからの全組み合わせで、numba なし用のフォールバック（_evaluate_combination_batch）と一致することを確認"""
+        fixed = _card_ints(Card('s', 14), Card('h', 13), Card('s', 12), Card('d', 7), Card('s', 2))
+        remaining = np.array([c for c in range(52) if c not in fixed.tolist()], dtype=np.int64)
+        combos = np.array([(a, b) for a in remaining for b in remaining if a < b], dtype=np.uint8)
+        expected = _evaluate_combination_batch(fixed.tolist(), combos)
+        self.assertEqual(category_counts(fixed, remaining, 2).tolist(), expected.tolist())
+
+    @unittest.skipUnless(_NUMBA_AVAILABLE, "numba なしでは C(50,5) の列挙が遅すぎる")
+    def test_preflop_category_counts_matches_category_counts(self):
+        """preflop_category_counts（スート 2・3 の入れ替え畳み込みあり / なし）が category_counts と一致することを確認"""
+        suited = _card_ints(Card('s', 14), Card('s', 13))
+        offsuit = _card_ints(Card('s', 14), Card('h', 13))
+        # スート 2・3 を含む手札があると畳み込みは使われない
+        diamonds = _card_ints(Card('d', 14), Card('d', 13))
+        for hands in ([suited, offsuit], [diamonds]):
+            got = preflop_category_counts(np.array(hands, dtype=np.int64))
+            for row, hand in zip(got, hands):
+                remaining = np.array([c for c in range(52) if c not in hand.tolist()], dtype=np.int64)
+                with self.subTest(hand=hand.tolist()):
+                    self.assertEqual(row.tolist(), category_counts(hand, remaining, 5).tolist())
+
+    def test_simulate_is_reproducible_with_seed(self):
+        """同じ seed の simulate は同じ勝敗数を返すことを確認"""
+        a = Hand((Card('s', 14), Card('h', 13)))
+        b = Hand((Card('d', 9), Card('c', 9)))
+        board = Board.from_cards([Card('s', 2), Card('h', 7), Card('c', 12)])
+        first = simulate(a, b, board, 5000, seed=42)
+        self.assertEqual(simulate(a, b, board, 5000, seed=42), first)
+        self.assertEqual(sum(first), 5000)
+
+    def test_simulate_aa_vs_kk(self):
+        """AA 対 KK のプリフロップ・オールインのエクイティが約 0.82 になることを確認"""
+        aa = Hand((Card('s', 14), Card('h', 14)))
+        kk = Hand((Card('d', 13), Card('c', 13)))
+        w, l, t = simulate(aa, kk, Board(), 40000, seed=7)
+        self.assertAlmostEqual((w + t / 2) / (w + l + t), 0.82, delta=0.02)
+
+    def test_remaining_cards_excludes_known(self):
+        """remaining_cards が既知のカードを除いた残り全部を返すことを確認"""
+        hand = Hand((Card('s', 14), Card('c', 2)))
+        rest = remaining_cards(hand.mask).tolist()
+        self.assertEqual(sorted(rest + [c.int_id for c in hand.cards]), list(range(52)))
+
+if __name__ == '__main__':
+    unittest.main()